@@ -0,0 +1,137 @@
+"""Cart storage models compared: one ``cart_items`` document per line
+(``CART_STORAGE=lines``) versus one ``carts`` document per user
+(``CART_STORAGE=document``), using cart_order_service's own stores.
+
+    python cart_storage.py                                   # in-memory mongomock
+    python cart_storage.py --mongo-url mongodb://localhost:27017 --users 500 --lines 8
+
+Each user adds ``--lines`` products twice (a new line, then an increment),
+reads the cart, removes one line, then reads and clears the rest the way
+checkout does. The ``thriftapp_cart_benchmark`` database is dropped before
+and after each model's run.
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR / "cart_order_service"))
+
+from pymongo import ASCENDING, IndexModel  # noqa: E402
+from carts import DocumentCarts, LineCarts  # noqa: E402
+from models import CartAddRequest  # noqa: E402
+
+DB_NAME = "thriftapp_cart_benchmark"
+MONGO_METHODS = {
+    "find", "find_one", "find_one_and_update", "update_one", "delete_one",
+    "delete_many", "insert_one", "bulk_write",
+}
+
+class CountingCollection:
+    """Passes calls through to a collection, counting MongoDB operations."""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.calls = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in MONGO_METHODS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return attr(*args, **kwargs)
+        return counted
+
+def percentile(sorted_values: list, pct: float) -> float:
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+async def run_model(name: str, store, collection: CountingCollection, users: int, lines: int, concurrency: int) -> dict:
+    latencies = defaultdict(list)
+    calls = defaultdict(int)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(op, call):
+        before = collection.calls
+        start = time.perf_counter()
+        result = await call
+        latencies[op].append(time.perf_counter() - start)
+        calls[op] += collection.calls - before
+        return result
+
+    async def session(user_id: int):
+        async with semaphore:
+            for _ in range(2):
+                for product_id in range(1, lines + 1):
+                    await timed("add", store.add(CartAddRequest(
+                        user_id=user_id, product_id=product_id,
+                        product_name=f"Product {product_id}", product_price=10.0,
+                    )))
+            await timed("get", store.get(user_id, limit=100))
+            await timed("remove", store.remove(user_id, lines))
+            items = await timed("checkout read", store.items_for_order(user_id))
+            await timed("checkout clear", store.clear(user_id, items))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(user_id) for user_id in range(1, users + 1)))
+    duration = time.perf_counter() - start
+
+    report = {}
+    for op, values in latencies.items():
+        values.sort()
+        report[op] = {
+            "mean_ms": sum(values) / len(values) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "mongo_ops": calls[op] / len(values),
+        }
+    print(f"\n{name}  ({duration:.2f}s, {collection.calls} MongoDB operations)")
+    print(f"{'operation':<18}{'mean ms':>10}{'p95 ms':>10}{'ops/call':>10}")
+    for op, row in report.items():
+        print(f"{op:<18}{row['mean_ms']:>10.3f}{row['p95_ms']:>10.3f}{row['mongo_ops']:>10.2f}")
+    return report
+
+async def main(args):
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(args.mongo_url)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+
+        client = AsyncMongoMockClient()
+
+    # Ids come from IdAllocator blocks in the service, which rarely touch
+    # MongoDB, so an in-memory sequence stands in for them here.
+    sequence = itertools.count(1)
+
+    async def next_id(_collection_name):
+        return next(sequence)
+
+    models = {
+        "lines": ("cart_items", [("user_id", ASCENDING), ("product_id", ASCENDING)],
+                  lambda collection: LineCarts(collection, next_id)),
+        "document": ("carts", [("user_id", ASCENDING)], DocumentCarts),
+    }
+    for name, (collection_name, keys, make_store) in models.items():
+        await client.drop_database(DB_NAME)
+        database = client[DB_NAME]
+        await database[collection_name].create_indexes([IndexModel(keys, unique=True)])
+        collection = CountingCollection(database[collection_name])
+        await run_model(name, make_store(collection), collection, args.users, args.lines, args.concurrency)
+    await client.drop_database(DB_NAME)
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the cart_items and carts storage models")
+    parser.add_argument("--mongo-url", help="run against this server instead of mongomock")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=5, help="distinct products per cart")
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
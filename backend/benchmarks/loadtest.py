@@ -0,0 +1,377 @@
+"""End-to-end load test that drives all four services in one process.
+
+Each virtual user registers, logs in, browses categories and products, fills
+a cart, checks out, polls delivery status and reads back its orders. Requests
+go straight to the FastAPI apps over httpx's ASGI transport, so the numbers
+measure the services and MongoDB, not the network.
+
+    python loadtest.py                                   # in-memory mongomock
+    python loadtest.py --mongo-url "mongodb://localhost:27017/?replicaSet=rs0"
+    python loadtest.py --users 200 --concurrency 20 --output run.json --baseline main.json
+
+The thriftapp_* databases on the target server are dropped before the run.
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import importlib
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SERVICES = ("user_service", "product_service", "cart_order_service", "delivery_service")
+# Top-level module names the services share; cleared between loads so each
+# service imports its own copy.
+SERVICE_MODULES = (
+    "main", "database", "models", "pool", "auth", "token_auth", "cache", "seed", "metrics",
+    "search", "status_feed", "history", "carts", "admission", "outbox",
+)
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "ping", "endSessions"}
+
+class OpCounter:
+    """Counts MongoDB operations issued by the services."""
+
+    def __init__(self):
+        self.total = 0
+        self._local = threading.local()
+        # Set in tasks whose mongomock operations are not the services' own.
+        self.uncounted = contextvars.ContextVar("uncounted", default=False)
+
+    def install_command_listener(self):
+        from pymongo import monitoring
+
+        counter = self
+
+        class _Listener(monitoring.CommandListener):
+            def started(self, event):
+                if event.command_name not in IGNORED_COMMANDS:
+                    counter.total += 1
+
+            def succeeded(self, event):
+                pass
+
+            def failed(self, event):
+                pass
+
+        # Applies to every client created afterwards, i.e. all of the services'.
+        monitoring.register(_Listener())
+
+    def install_mongomock_hooks(self):
+        from mongomock.collection import Collection
+
+        for name in (
+            "find", "find_one", "find_one_and_update", "find_one_and_delete",
+            "insert_one", "insert_many", "update_one", "update_many",
+            "delete_one", "delete_many", "aggregate", "count_documents",
+            "bulk_write", "create_indexes",
+        ):
+            setattr(Collection, name, self._counted(getattr(Collection, name)))
+
+    def _counted(self, method):
+        counter = self
+
+        def wrapper(*args, **kwargs):
+            # mongomock implements some operations on top of others (find_one
+            # calls find); only the outermost call is a client operation.
+            depth = getattr(counter._local, "depth", 0)
+            if depth == 0 and not counter.uncounted.get():
+                counter.total += 1
+            counter._local.depth = depth + 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                counter._local.depth = depth
+
+        return wrapper
+
+def load_service(service: str, mock_client=None):
+    """Imports ``service``'s modules and returns ``(main, database, seed)``."""
+    path = str(BACKEND_DIR / service)
+    for name in SERVICE_MODULES:
+        sys.modules.pop(name, None)
+    sys.path.insert(0, path)
+    try:
+        if mock_client is not None:
+            pool = importlib.import_module("pool")
+            pool.create_client = lambda url: mock_client
+
+            async def skip_warm(client):
+                pass
+
+            pool.warm_pool = skip_warm
+        main = importlib.import_module("main")
+        database = sys.modules["database"]
+        if mock_client is not None and service == "delivery_service":
+            # mongomock_motor's with_options() returns a plain synchronous
+            # mongomock collection; read statuses through the motor wrapper.
+            main.status_reads = database.db.delivery_statuses
+        seed = importlib.import_module("seed") if service == "product_service" else None
+        # Every service defines the same Prometheus metric names; drop this
+        # copy from the global registry so the next service can register its own.
+        from prometheus_client import REGISTRY
+        from prometheus_client.metrics import MetricWrapperBase
+
+        for value in vars(sys.modules["metrics"]).values():
+            if isinstance(value, MetricWrapperBase):
+                REGISTRY.unregister(value)
+    finally:
+        sys.path.remove(path)
+        for name in SERVICE_MODULES:
+            sys.modules.pop(name, None)
+    return main, database, seed
+
+class Recorder:
+    def __init__(self, ops: OpCounter):
+        self.ops = ops
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.ops_per_request = {}
+        self.profiling = False
+
+    async def call(self, client, step: str, method: str, url: str, **kwargs):
+        ops_before = self.ops.total
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        if self.profiling:
+            self.ops_per_request[step] = self.ops.total - ops_before
+            return response
+        self.latencies[step].append(elapsed)
+        if response.status_code >= 400:
+            self.errors[step] += 1
+        return response
+
+async def user_flow(clients: dict, recorder: Recorder, run_id: str, index: int, polls: int):
+    users, products, orders, delivery = (
+        clients["user_service"], clients["product_service"],
+        clients["cart_order_service"], clients["delivery_service"],
+    )
+    credentials = {"email": f"bench-{run_id}-{index}@example.com", "password": "bench-password"}
+    await recorder.call(
+        users, "POST /register", "POST", "/register",
+        json={"name": f"Bench User {index}", **credentials},
+    )
+    login = await recorder.call(users, "POST /login", "POST", "/login", json=credentials)
+    if login.status_code != 200:
+        return
+    user_id = login.json()["user_id"]
+
+    categories = (await recorder.call(products, "GET /categories", "GET", "/categories")).json()
+    category = categories[index % len(categories)]["name"]
+    listing = (await recorder.call(
+        products, "GET /products?category=", "GET", "/products", params={"category": category},
+    )).json()
+    await recorder.call(products, "GET /products?limit=", "GET", "/products", params={"limit": 20})
+    picked = listing[:3]
+    for product in picked:
+        await recorder.call(products, "GET /products/{id}", "GET", f"/products/{product['id']}")
+        await recorder.call(
+            orders, "POST /cart/add", "POST", "/cart/add",
+            json={"user_id": user_id, "product_id": product["id"], "quantity": 1 + index % 3},
+        )
+    await recorder.call(orders, "GET /cart", "GET", "/cart", params={"user_id": user_id})
+
+    order = await recorder.call(
+        orders, "POST /order/create", "POST", "/order/create", json={"user_id": user_id},
+    )
+    if order.status_code != 200:
+        return
+    order_id = order.json()["id"]
+    if recorder.profiling:
+        # Let the outbox worker create the delivery record, so the profile
+        # shows status reads of a drained order rather than a pending one.
+        await asyncio.sleep(0.2)
+
+    for _ in range(polls):
+        await recorder.call(
+            delivery, "GET /order/{id}/status", "GET", f"/order/{order_id}/status",
+        )
+    await recorder.call(
+        delivery, "POST /order/{id}/update-status", "POST", f"/order/{order_id}/update-status",
+    )
+    await recorder.call(orders, "GET /orders", "GET", "/orders", params={"user_id": user_id})
+
+async def drain_outbox(worker, ops: OpCounter, interval: float = 0.05):
+    # The real worker runs beside the services; keep its work out of the
+    # per-request operation counts.
+    ops.uncounted.set(True)
+    while True:
+        await worker.drain_once()
+        await asyncio.sleep(interval)
+
+def percentile(sorted_values: list, pct: float) -> float:
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(recorder: Recorder, duration: float) -> dict:
+    endpoints = {}
+    for step, values in recorder.latencies.items():
+        values = sorted(values)
+        endpoints[step] = {
+            "count": len(values),
+            "errors": recorder.errors[step],
+            "throughput_rps": round(len(values) / duration, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+            "max_ms": round(values[-1] * 1000, 3),
+            "mongo_ops_per_request": recorder.ops_per_request.get(step),
+        }
+    return endpoints
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(result: dict, baseline: dict | None):
+    run = result["run"]
+    print(
+        f"{run['backend']}  commit={run['git_commit']}  users={run['users']}  "
+        f"concurrency={run['concurrency']}  {run['requests']} requests in "
+        f"{run['duration_s']}s  ({run['throughput_rps']} req/s, {run['errors']} errors, "
+        f"{run['mongo_ops']} mongo ops)"
+    )
+    header = f"{'endpoint':<32}{'count':>7}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'ops':>5}"
+    if baseline:
+        header += f"{'p95 vs base':>13}"
+    print(header + "  (ms)")
+    for step, stats in result["endpoints"].items():
+        line = (
+            f"{step:<32}{stats['count']:>7}{stats['throughput_rps']:>9}"
+            f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}"
+            f"{stats['mongo_ops_per_request'] if stats['mongo_ops_per_request'] is not None else '-':>5}"
+        )
+        base = baseline["endpoints"].get(step) if baseline else None
+        if base:
+            change = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100 if base["p95_ms"] else 0.0
+            line += f"{change:>+12.1f}%"
+        print(line)
+
+async def run(args) -> dict:
+    os.environ.setdefault("SECRET_KEY", "loadtest-secret")
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://mongomock"
+
+    ops = OpCounter()
+    mock_client = None
+    if args.mongo_url:
+        ops.install_command_listener()
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+
+        ops.install_mongomock_hooks()
+        # One client for every service so cart_order sees product_service's catalog.
+        mock_client = AsyncMongoMockClient()
+
+    loaded = {service: load_service(service, mock_client) for service in SERVICES}
+    if mock_client is None:
+        admin_client = loaded["user_service"][1].client
+        for name in await admin_client.list_database_names():
+            if name.startswith("thriftapp_"):
+                await admin_client.drop_database(name)
+
+    import httpx
+
+    async with contextlib.AsyncExitStack() as stack:
+        clients = {}
+        for service, (module, database, _seed) in loaded.items():
+            app = module.app
+            if mock_client is None:
+                await stack.enter_async_context(app.router.lifespan_context(app))
+            else:
+                await database.ensure_indexes()
+            clients[service] = await stack.enter_async_context(httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url=f"http://{service}",
+            ))
+        if mock_client is not None:
+            # mongomock has no "hello" command and no transactions.
+            loaded["cart_order_service"][1]._transactions_supported = False
+            # Nor change streams or lifespans here, so drain the outbox often,
+            # about as soon as a change stream would wake the worker.
+            drainer = asyncio.create_task(
+                drain_outbox(loaded["delivery_service"][0].outbox_worker, ops)
+            )
+            stack.callback(drainer.cancel)
+
+        catalog = loaded["product_service"][1].db
+        seed = loaded["product_service"][2]
+        await catalog.products.insert_many(
+            [{**product, "id": i} for i, product in enumerate(seed.SEED_PRODUCTS, start=1)]
+        )
+        await catalog.counters.update_one(
+            {"_id": "products"}, {"$set": {"seq": len(seed.SEED_PRODUCTS)}}, upsert=True,
+        )
+
+        run_id = uuid.uuid4().hex[:8]
+        recorder = Recorder(ops)
+
+        # Two serial passes first: with nothing else in flight, the op counter
+        # delta around each request is exactly that request's Mongo work. The
+        # second pass overwrites the first so cached reads show as warm.
+        recorder.profiling = True
+        for index in (-1, -2):
+            await user_flow(clients, recorder, run_id, index, args.polls)
+        recorder.profiling = False
+
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(index: int):
+            async with slots:
+                await user_flow(clients, recorder, run_id, index, args.polls)
+
+        ops_before = ops.total
+        start = time.perf_counter()
+        await asyncio.gather(*(bounded(i) for i in range(args.users)))
+        duration = time.perf_counter() - start
+
+    endpoints = summarize(recorder, duration)
+    requests = sum(stats["count"] for stats in endpoints.values())
+    return {
+        "run": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": git_commit(),
+            "backend": "mongod" if args.mongo_url else "mongomock",
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "polls": args.polls,
+            "duration_s": round(duration, 3),
+            "requests": requests,
+            "throughput_rps": round(requests / duration, 2),
+            "errors": sum(stats["errors"] for stats in endpoints.values()),
+            "mongo_ops": ops.total - ops_before,
+        },
+        "endpoints": endpoints,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--mongo-url", help="run against this server instead of mongomock")
+    parser.add_argument("--users", type=int, default=50, help="virtual users (one flow each)")
+    parser.add_argument("--concurrency", type=int, default=10, help="flows in flight at once")
+    parser.add_argument("--polls", type=int, default=3, help="status polls per order")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier JSON report to compare p95 against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print_report(result, baseline)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Serialization cost of list responses: FastAPI's validate-then-encode path
+versus sending trusted MongoDB documents with orjson.
+
+    python serialization.py [iterations]
+"""
+import importlib.util
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import orjson
+from pydantic import TypeAdapter
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+SIZES = (100, 1000)
+
+def _load_models(service: str):
+    spec = importlib.util.spec_from_file_location(f"{service}_models", BACKEND_DIR / service / "models.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _product(i: int) -> dict:
+    return {
+        "id": i,
+        "name": f"Product {i}",
+        "description": "Farm fresh, hand picked and packed the same day",
+        "price": 40.0 + i % 50,
+        "category": "Fruits & Vegetables",
+        "image_url": f"https://images.example.com/products/{i}.jpg",
+        "is_available": True,
+    }
+
+def _order(i: int) -> dict:
+    return {
+        "id": i,
+        "user_id": 1,
+        "order_ref": f"ORD-{i:08X}",
+        "total": 250.0,
+        "created_at": datetime(2026, 1, 1, tzinfo=timezone.utc),
+        "items": [
+            {"product_id": j, "product_name": f"Product {j}", "quantity": 2, "price": 25.0}
+            for j in range(5)
+        ],
+    }
+
+def fastapi_path(adapter: TypeAdapter, docs: list) -> bytes:
+    # What FastAPI does with a response_model: validate, dump to JSON-able
+    # Python, then JSONResponse.render.
+    value = adapter.validate_python(docs)
+    content = adapter.dump_python(value, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+def hand_built_orders(models, adapter: TypeAdapter, docs: list) -> bytes:
+    # The old get_orders: build OrderResponse per document, then the FastAPI path.
+    built = [
+        models.OrderResponse(
+            **{key: value for key, value in doc.items() if key != "items"},
+            items=[models.OrderItemResponse(**item) for item in doc["items"]],
+        )
+        for doc in docs
+    ]
+    return fastapi_path(adapter, built)
+
+def orjson_path(docs: list) -> bytes:
+    return orjson.dumps(docs)
+
+def _time(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    products = _load_models("product_service")
+    orders = _load_models("cart_order_service")
+    product_list = TypeAdapter(list[products.ProductResponse])
+    order_list = TypeAdapter(list[orders.OrderResponse])
+
+    print(f"{'payload':<24}{'items':>7}{'fastapi':>12}{'hand-built':>12}{'orjson':>12}  (ms per response)")
+    for size in SIZES:
+        docs = [_product(i) for i in range(size)]
+        print(
+            f"{'products':<24}{size:>7}"
+            f"{_time(lambda: fastapi_path(product_list, docs), iterations):>12.3f}"
+            f"{'-':>12}"
+            f"{_time(lambda: orjson_path(docs), iterations):>12.3f}"
+        )
+        docs = [_order(i) for i in range(size)]
+        print(
+            f"{'orders (5 items each)':<24}{size:>7}"
+            f"{_time(lambda: fastapi_path(order_list, docs), iterations):>12.3f}"
+            f"{_time(lambda: hand_built_orders(orders, order_list, docs), iterations):>12.3f}"
+            f"{_time(lambda: orjson_path(docs), iterations):>12.3f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from metrics import MetricsMiddleware, metrics_response
+from admission import AdmissionController, AdmissionMiddleware
+from token_auth import authenticate
+from upstream import UPSTREAMS, UpstreamError, cart_orders, create_client, delivery, products, users
+
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "30"))
+# How long a catalog that could not be refreshed may still be served.
+CATALOG_MAX_STALE_SECONDS = float(os.getenv("CATALOG_MAX_STALE_SECONDS", "600"))
+CATALOG_RETRY_SECONDS = float(os.getenv("CATALOG_RETRY_SECONDS", "5"))
+# Products embedded in /home; the full catalog is paged from the catalog service.
+HOME_PRODUCTS_LIMIT = int(os.getenv("HOME_PRODUCTS_LIMIT", "100"))
+
+class CatalogCache:
+    """Categories and products are the same for every user, so one copy is
+    shared by all /home requests.
+
+    At most one refresh runs at a time and concurrent callers wait for it.
+    If a refresh fails, the previous catalog is served until it is
+    ``CATALOG_MAX_STALE_SECONDS`` old.
+    """
+
+    def __init__(self, ttl: float, max_stale: float):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.hits = 0
+        self.refreshes = 0
+        self.stale_served = 0
+        self._value = None
+        self._fetched_at = 0.0
+        self._failed_at = float("-inf")
+        self._error = None
+        self._lock = asyncio.Lock()
+
+    async def _fetch(self) -> dict:
+        categories, page = await asyncio.gather(
+            products.get("/categories"),
+            products.get("/products", params={"limit": HOME_PRODUCTS_LIMIT}),
+        )
+        return {"categories": categories, "products": page["items"] if page else None}
+
+    async def get(self) -> tuple[dict, bool]:
+        """Returns ``(catalog, stale)``; raises ``UpstreamError`` only when
+        there is nothing usable to serve."""
+        if self._fresh():
+            self.hits += 1
+            return self._value, False
+        async with self._lock:
+            if self._fresh():
+                self.hits += 1
+                return self._value, False
+            # After a failed refresh, waiters get the stale copy (or the
+            # error) at once instead of each retrying the upstream in turn.
+            if time.monotonic() - self._failed_at >= CATALOG_RETRY_SECONDS:
+                try:
+                    value = await self._fetch()
+                except UpstreamError as exc:
+                    self._failed_at = time.monotonic()
+                    self._error = exc
+                else:
+                    self._value, self._fetched_at = value, time.monotonic()
+                    self.refreshes += 1
+                    return value, False
+            if self._value is not None and time.monotonic() - self._fetched_at < self.max_stale:
+                self.stale_served += 1
+                return self._value, True
+            raise self._error
+
+    def _fresh(self) -> bool:
+        return self._value is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl,
+            "age_seconds": time.monotonic() - self._fetched_at if self._value is not None else None,
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "stale_served": self.stale_served,
+        }
+
+catalog_cache = CatalogCache(CATALOG_TTL_SECONDS, CATALOG_MAX_STALE_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    client = create_client()
+    for upstream in UPSTREAMS:
+        upstream.client = client
+    yield
+    await client.aclose()
+
+admission = AdmissionController({"GET /home": 128}, authenticate=authenticate)
+
+app = FastAPI(
+    title="Home Aggregation Service",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+app.add_middleware(AdmissionMiddleware, controller=admission)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@app.get("/")
+def root():
+    return {"service": "Home Aggregation Service", "status": "running"}
+
+@app.get("/health")
+def health():
+    return {"status": "healthy", "service": "bff_service"}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
+
+@app.get("/admin/admission-stats")
+def get_admission_stats():
+    return admission.stats()
+
+@app.get("/admin/upstream-stats")
+def get_upstream_stats():
+    return {
+        "upstreams": {upstream.name: upstream.stats() for upstream in UPSTREAMS},
+        "catalog_cache": catalog_cache.stats(),
+    }
+
+async def _latest_order(user_id: int, errors: dict):
+    page = await cart_orders.get(
+        "/orders", params={"user_id": user_id, "summary": "true", "limit": 1},
+    )
+    if not page or not page["items"]:
+        return None
+    order = page["items"][0]
+    try:
+        order["delivery"] = await delivery.get(f"/order/{order['id']}/status")
+    except UpstreamError as exc:
+        order["delivery"] = None
+        errors["delivery"] = exc.reason
+    return order
+
+@app.get("/home")
+async def get_home(request: Request, user_id: int = Query(...)):
+    """Everything the home screen needs, fetched from the four services at
+    once. A section whose service fails or times out is ``null`` and its
+    reason is listed under ``errors``; the rest is still returned."""
+    headers = {}
+    if "authorization" in request.headers:
+        headers["Authorization"] = request.headers["authorization"]
+    errors = {}
+
+    async def section(name, call):
+        try:
+            return await call
+        except UpstreamError as exc:
+            errors[name] = exc.reason
+            return None
+
+    profile, catalog, cart, latest_order = await asyncio.gather(
+        section("profile", users.get("/profile", params={"user_id": user_id}, headers=headers)),
+        section("catalog", catalog_cache.get()),
+        section("cart", cart_orders.get("/cart", params={"user_id": user_id})),
+        section("latest_order", _latest_order(user_id, errors)),
+    )
+    catalog, stale = catalog if catalog else ({"categories": None, "products": None}, False)
+    return {
+        "profile": profile,
+        "categories": catalog["categories"],
+        "products": catalog["products"],
+        "catalog_stale": stale,
+        "cart": cart,
+        "latest_order": latest_order,
+        "errors": errors,
+    }
@@ -0,0 +1,86 @@
+import os
+import time
+import httpx
+
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:8001")
+PRODUCT_SERVICE_URL = os.getenv("PRODUCT_SERVICE_URL", "http://localhost:8002")
+CART_ORDER_SERVICE_URL = os.getenv("CART_ORDER_SERVICE_URL", "http://localhost:8003")
+DELIVERY_SERVICE_URL = os.getenv("DELIVERY_SERVICE_URL", "http://localhost:8004")
+
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "1.0"))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "200"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "50"))
+UPSTREAM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY_SECONDS", "30"))
+
+class UpstreamError(Exception):
+    """An upstream call failed; ``reason`` is safe to show to clients."""
+
+    def __init__(self, upstream: str, reason: str):
+        super().__init__(f"{upstream}: {reason}")
+        self.reason = reason
+
+class Upstream:
+    """GETs JSON from one service with its own timeout, counting outcomes."""
+
+    def __init__(self, name: str, base_url: str, timeout: float):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.client: httpx.AsyncClient | None = None
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.seconds_total = 0.0
+
+    async def get(self, path: str, params: dict | None = None, headers: dict | None = None):
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            response = await self.client.get(
+                self.base_url + path, params=params, headers=headers, timeout=self.timeout,
+            )
+        except httpx.TimeoutException:
+            self.timeouts += 1
+            raise UpstreamError(self.name, "timeout")
+        except httpx.HTTPError as exc:
+            self.failures += 1
+            raise UpstreamError(self.name, f"unavailable ({type(exc).__name__})")
+        finally:
+            self.seconds_total += time.perf_counter() - start
+
+        if response.status_code == 404:
+            return None
+        if response.status_code >= 400:
+            self.failures += 1
+            raise UpstreamError(self.name, f"HTTP {response.status_code}")
+        return response.json()
+
+    def stats(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "timeout_seconds": self.timeout,
+            "requests": self.requests,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "avg_ms": self.seconds_total / self.requests * 1000 if self.requests else 0.0,
+        }
+
+def _timeout(name: str) -> float:
+    return float(os.getenv(f"{name.upper()}_TIMEOUT_SECONDS", UPSTREAM_TIMEOUT_SECONDS))
+
+users = Upstream("user_service", USER_SERVICE_URL, _timeout("user_service"))
+products = Upstream("product_service", PRODUCT_SERVICE_URL, _timeout("product_service"))
+cart_orders = Upstream("cart_order_service", CART_ORDER_SERVICE_URL, _timeout("cart_order_service"))
+delivery = Upstream("delivery_service", DELIVERY_SERVICE_URL, _timeout("delivery_service"))
+UPSTREAMS = (users, products, cart_orders, delivery)
+
+def create_client() -> httpx.AsyncClient:
+    """One pooled keep-alive client shared by every upstream, so the fan-out
+    reuses warm connections instead of opening four per request."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
@@ -0,0 +1,245 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from metrics import (
+    ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_SECONDS, ADMISSION_SHED, ADMISSION_WAITING, route_path,
+)
+
+# "METHOD /path=limit" pairs, comma-separated, e.g. "POST /login=16,GET /cart=64".
+# Routes are path templates as declared in main.py; these override the
+# service's own defaults. 0 removes a limit.
+ADMISSION_ROUTE_LIMITS = os.getenv("ADMISSION_ROUTE_LIMITS", "")
+# Limit for every route not listed; 0 means unlimited.
+ADMISSION_DEFAULT_LIMIT = int(os.getenv("ADMISSION_DEFAULT_LIMIT", "0"))
+ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", "64"))
+ADMISSION_MAX_QUEUE_SECONDS = float(os.getenv("ADMISSION_MAX_QUEUE_SECONDS", "0.5"))
+# Per-user token bucket; 0 turns rate limiting off.
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+RATE_LIMIT_MAX_USERS = int(os.getenv("RATE_LIMIT_MAX_USERS", "10000"))
+# Proxies in front of the service (e.g. 1 behind an ingress) whose
+# X-Forwarded-For entries are trusted; 0 keys on the peer address.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+
+# Probes and scrapes must keep working while the service sheds load.
+EXEMPT_PATHS = {"/", "/health", "/metrics"}
+
+def _parse_limits(spec: str) -> dict[str, int]:
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, limit = entry.rpartition("=")
+        limits[" ".join(route.split())] = int(limit)
+    return limits
+
+class RouteLimiter:
+    """At most ``limit`` requests at once; up to ``max_waiting`` more queue,
+    each for at most ``max_queue_seconds``, and the rest are shed."""
+
+    def __init__(self, route: str, limit: int, max_waiting: int, max_queue_seconds: float):
+        self.route = route
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.max_queue_seconds = max_queue_seconds
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_queue_timeout = 0
+        self._slots = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> str | None:
+        """Takes a slot; returns the shed reason instead when it cannot."""
+        if self._slots.locked():
+            if self.waiting >= self.max_waiting:
+                self.shed_queue_full += 1
+                return "queue_full"
+            self.waiting += 1
+            ADMISSION_WAITING.labels(self.route).inc()
+            start = time.perf_counter()
+            try:
+                # Unlike wait_for, a timeout here never strands a slot that
+                # was granted just as the wait gave up.
+                async with asyncio.timeout(self.max_queue_seconds):
+                    await self._slots.acquire()
+            except TimeoutError:
+                self.shed_queue_timeout += 1
+                return "queue_timeout"
+            finally:
+                self.waiting -= 1
+                ADMISSION_WAITING.labels(self.route).dec()
+                ADMISSION_QUEUE_SECONDS.labels(self.route).observe(time.perf_counter() - start)
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+        ADMISSION_IN_FLIGHT.labels(self.route).inc()
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.labels(self.route).dec()
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_queue_timeout": self.shed_queue_timeout,
+        }
+
+class TokenBuckets:
+    """One token bucket per user, ``rate`` tokens/s up to ``burst``; the
+    least recently seen users are forgotten beyond ``max_users``."""
+
+    def __init__(self, rate: float, burst: int, max_users: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self.limited = 0
+        self._buckets: OrderedDict = OrderedDict()
+
+    def take(self, user: str, now: float) -> float:
+        """Spends a token and returns 0, or returns seconds until one is available."""
+        tokens, updated = self._buckets.pop(user, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+            self.limited += 1
+        self._buckets[user] = (tokens, now)
+        if len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "tracked_users": len(self._buckets),
+            "limited": self.limited,
+        }
+
+class AdmissionController:
+    """Per-route limits plus optional per-user rate limits. ``authenticate``
+    (token -> user id, raising ``HTTPException``) lets users with a bearer
+    token be rate-limited by who they are rather than by address."""
+
+    def __init__(self, limits: dict[str, int], authenticate=None):
+        self.authenticate = authenticate
+        limits = {**limits, **_parse_limits(ADMISSION_ROUTE_LIMITS)}
+        self._limiters = {
+            route: RouteLimiter(route, limit, ADMISSION_MAX_WAITING, ADMISSION_MAX_QUEUE_SECONDS)
+            for route, limit in limits.items()
+            if limit > 0
+        }
+        self._unlimited = {route for route, limit in limits.items() if limit <= 0}
+        self.buckets = (
+            TokenBuckets(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_MAX_USERS)
+            if RATE_LIMIT_PER_SECOND > 0 else None
+        )
+
+    def limiter(self, route: str) -> RouteLimiter | None:
+        limiter = self._limiters.get(route)
+        if limiter is None and ADMISSION_DEFAULT_LIMIT > 0 and route not in self._unlimited:
+            limiter = self._limiters[route] = RouteLimiter(
+                route, ADMISSION_DEFAULT_LIMIT, ADMISSION_MAX_WAITING, ADMISSION_MAX_QUEUE_SECONDS,
+            )
+        return limiter
+
+    def stats(self) -> dict:
+        return {
+            "max_waiting": ADMISSION_MAX_WAITING,
+            "max_queue_seconds": ADMISSION_MAX_QUEUE_SECONDS,
+            "routes": {route: limiter.stats() for route, limiter in self._limiters.items()},
+            "rate_limit": self.buckets.stats() if self.buckets else None,
+        }
+
+def _client_address(scope) -> str:
+    if RATE_LIMIT_TRUSTED_PROXIES > 0:
+        hops = [
+            hop.strip()
+            for name, value in scope.get("headers", ())
+            if name == b"x-forwarded-for"
+            for hop in value.decode("latin-1").split(",")
+            if hop.strip()
+        ]
+        # The entry our outermost trusted proxy appended; anything left of
+        # it was sent by the client and may be forged.
+        if len(hops) >= RATE_LIMIT_TRUSTED_PROXIES:
+            return hops[-RATE_LIMIT_TRUSTED_PROXIES]
+    client = scope.get("client")
+    return client[0] if client else ""
+
+def _user_key(scope, authenticate) -> str:
+    # Only verified identities: a user_id parameter or an unchecked token
+    # would let a client spend someone else's bucket or dodge its own.
+    if authenticate is not None:
+        for name, value in scope.get("headers", ()):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer" and token:
+                    try:
+                        return f"user:{authenticate(token.strip())}"
+                    except HTTPException:
+                        pass
+                break
+    return "addr:" + _client_address(scope)
+
+class AdmissionMiddleware:
+    """Applies ``controller``'s rate limits and per-route concurrency limits.
+
+    Shed requests get 503 with ``Retry-After`` before reaching the route, so
+    an overloaded expensive route cannot tie up the MongoDB pool that cheap
+    routes need. Rate-limited users get 429.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        route = f"{scope['method']} {scope.get('route_path') or route_path(scope)}"
+        buckets = self.controller.buckets
+        if buckets is not None:
+            wait = buckets.take(_user_key(scope, self.controller.authenticate), time.monotonic())
+            if wait:
+                ADMISSION_SHED.labels(route, "rate_limited").inc()
+                response = JSONResponse(
+                    {"detail": "Too many requests, slow down"},
+                    status_code=429,
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+                await response(scope, receive, send)
+                return
+
+        limiter = self.controller.limiter(route)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        shed_reason = await limiter.acquire()
+        if shed_reason:
+            ADMISSION_SHED.labels(route, shed_reason).inc()
+            response = JSONResponse(
+                {"detail": "Service is busy, try again shortly"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -0,0 +1,161 @@
+import os
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from models import CartAddRequest, CartItemResponse, projection
+
+# "lines": one cart_items document per (user, product).
+# "document": one carts document per user with an embedded items array.
+CART_STORAGE = os.getenv("CART_STORAGE", "lines")
+
+def _literal(value):
+    # Strings starting with "$" would be read as field paths in a pipeline.
+    if isinstance(value, str) and value.startswith("$"):
+        return {"$literal": value}
+    return value
+
+class LineCarts:
+    """Each cart line is its own ``cart_items`` document."""
+
+    def __init__(self, collection, next_id):
+        self.collection = collection
+        self.next_id = next_id
+
+    async def add(self, request: CartAddRequest) -> dict:
+        set_fields = {}
+        if request.product_name:
+            set_fields["product_name"] = request.product_name
+        if request.product_price:
+            set_fields["product_price"] = request.product_price
+
+        set_on_insert = {"id": await self.next_id("cart_items")}
+        for field in ("product_name", "product_price"):
+            if field not in set_fields:
+                set_on_insert[field] = None
+
+        update = {"$inc": {"quantity": request.quantity}, "$setOnInsert": set_on_insert}
+        if set_fields:
+            update["$set"] = set_fields
+
+        return await self.collection.find_one_and_update(
+            {"user_id": request.user_id, "product_id": request.product_id},
+            update,
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def remove(self, user_id: int, product_id: int) -> bool:
+        result = await self.collection.delete_one(
+            {"user_id": user_id, "product_id": product_id}
+        )
+        return result.deleted_count > 0
+
+    async def get(self, user_id: int, limit: int) -> list[dict]:
+        return await self.collection.find(
+            {"user_id": user_id}, projection(CartItemResponse)
+        ).to_list(length=limit)
+
+    async def items_for_order(self, user_id: int, session=None) -> list[dict]:
+        return await self.collection.find(
+            {"user_id": user_id}, session=session
+        ).to_list(length=None)
+
+    async def clear(self, user_id: int, items: list[dict], session=None):
+        await self.collection.delete_many(
+            {"_id": {"$in": [item["_id"] for item in items]}}, session=session
+        )
+
+class DocumentCarts:
+    """Each user's cart is one ``carts`` document with an embedded ``items``
+    array, so every cart operation reads or writes a single document.
+
+    A cart holds one line per product, so lines are identified by their
+    ``product_id`` and need no id from ``counters``.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def add(self, request: CartAddRequest) -> dict:
+        """Increments the product's line or appends it, with one pipeline
+        update upserted on the user's cart."""
+        product_id = request.product_id
+        added = {
+            "id": product_id,
+            "product_id": product_id,
+            "product_name": _literal(request.product_name or None),
+            "product_price": _literal(request.product_price or None),
+            "quantity": request.quantity,
+        }
+        incremented = {
+            "id": "$$line.id",
+            "product_id": "$$line.product_id",
+            "product_name": "$$line.product_name",
+            "product_price": "$$line.product_price",
+            "quantity": {"$add": ["$$line.quantity", request.quantity]},
+        }
+        for field in ("product_name", "product_price"):
+            value = getattr(request, field)
+            if value:
+                incremented[field] = _literal(value)
+        pipeline = [{"$set": {"items": {"$let": {
+            "vars": {"items": {"$ifNull": ["$items", []]}},
+            "in": {"$cond": [
+                {"$in": [product_id, "$$items.product_id"]},
+                {"$map": {"input": "$$items", "as": "line", "in": {"$cond": [
+                    {"$eq": ["$$line.product_id", product_id]}, incremented, "$$line",
+                ]}}},
+                {"$concatArrays": ["$$items", [added]]},
+            ]},
+        }}}}]
+        arguments = dict(
+            projection={"_id": 0, "items": {"$elemMatch": {"product_id": product_id}}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        try:
+            cart = await self.collection.find_one_and_update(
+                {"user_id": request.user_id}, pipeline, **arguments
+            )
+        except DuplicateKeyError:
+            # A concurrent add created the cart first; it exists now.
+            cart = await self.collection.find_one_and_update(
+                {"user_id": request.user_id}, pipeline, **arguments
+            )
+        return {**cart["items"][0], "user_id": request.user_id}
+
+    async def remove(self, user_id: int, product_id: int) -> bool:
+        result = await self.collection.update_one(
+            {"user_id": user_id, "items.product_id": product_id},
+            {"$pull": {"items": {"product_id": product_id}}},
+        )
+        return result.modified_count > 0
+
+    async def get(self, user_id: int, limit: int) -> list[dict]:
+        cart = await self.collection.find_one(
+            {"user_id": user_id}, {"_id": 0, "items": {"$slice": limit}}
+        )
+        if not cart:
+            return []
+        return [{**item, "user_id": user_id} for item in cart.get("items", [])]
+
+    async def items_for_order(self, user_id: int, session=None) -> list[dict]:
+        cart = await self.collection.find_one(
+            {"user_id": user_id}, {"_id": 0, "items": 1}, session=session
+        )
+        return cart.get("items", []) if cart else []
+
+    async def clear(self, user_id: int, items: list[dict], session=None):
+        # Only the lines that were ordered, like LineCarts deleting by _id.
+        await self.collection.update_one(
+            {"user_id": user_id},
+            {"$pull": {"items": {"product_id": {"$in": [item["product_id"] for item in items]}}}},
+            session=session,
+        )
+
+def create_cart_store(database, next_id):
+    if CART_STORAGE == "lines":
+        return LineCarts(database.cart_items, next_id)
+    if CART_STORAGE == "document":
+        return DocumentCarts(database.carts)
+    raise RuntimeError(f"CART_STORAGE must be 'lines' or 'document', not {CART_STORAGE!r}")
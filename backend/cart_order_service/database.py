@@ -1,8 +1,13 @@
+import asyncio
+import logging
 import os
-import certifi
 from pathlib import Path
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import OperationFailure
+from pool import create_client
+
+logger = logging.getLogger(__name__)
 
 load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
 
@@ -10,15 +15,134 @@ MONGO_URL = os.getenv("MONGO_URL")
 if not MONGO_URL:
     raise RuntimeError("MONGO_URL environment variable is not set")
 DB_NAME = "thriftapp_cart_orders"
+PRODUCTS_DB_NAME = os.getenv("PRODUCTS_DB_NAME", "thriftapp_products")
+# How long outbox events are kept; consumers keep their own checkpoints, so
+# one that is down for longer misses events (delivery_service's backfill.py
+# recovers its records).
+OUTBOX_RETENTION_SECONDS = int(os.getenv("OUTBOX_RETENTION_SECONDS", "86400"))
 
-client = AsyncIOMotorClient(MONGO_URL, tlsCAFile=certifi.where())
+client = create_client(MONGO_URL)
 db = client[DB_NAME]
+# Read model of the product catalog; product_service owns the writes.
+catalog_db = client[PRODUCTS_DB_NAME]
+
+_transactions_supported = None
+
+async def supports_transactions() -> bool:
+    global _transactions_supported
+    if _transactions_supported is None:
+        hello = await client.admin.command("hello")
+        _transactions_supported = bool(
+            hello.get("setName") or hello.get("msg") == "isdbgrid"
+        )
+        if not _transactions_supported:
+            logger.warning(
+                "MongoDB is a standalone server; orders are created without a transaction"
+            )
+    return _transactions_supported
+
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "1000"))
+
+class IdAllocator:
+    """Hands out ids from blocks reserved on the shared ``counters`` document.
+
+    Each reservation bumps the counter by a whole block with one atomic
+    ``$inc``, so blocks never overlap across workers or replicas. Ids are
+    unique and increasing within a process, but not globally ordered.
+    """
+
+    def __init__(self, collection_name: str, block_size: int = ID_BLOCK_SIZE):
+        self.collection_name = collection_name
+        self.block_size = block_size
+        self.low_water = max(1, block_size // 10)
+        self._next = 0
+        self._end = 0
+        self._refill = None
+        self._lock = asyncio.Lock()
+
+    async def _reserve_block(self) -> tuple[int, int]:
+        counter = await db.counters.find_one_and_update(
+            {"_id": self.collection_name},
+            {"$inc": {"seq": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        end = counter["seq"] + 1
+        return end - self.block_size, end
+
+    async def next_id(self) -> int:
+        while self._next >= self._end:
+            async with self._lock:
+                if self._next < self._end:
+                    break
+                if self._refill is None:
+                    self._refill = asyncio.ensure_future(self._reserve_block())
+                refill, self._refill = self._refill, None
+                self._next, self._end = await refill
+
+        value = self._next
+        self._next += 1
+        if self._refill is None and self._end - self._next <= self.low_water:
+            self._refill = asyncio.ensure_future(self._reserve_block())
+        return value
+
+_allocators: dict[str, IdAllocator] = {}
 
 async def get_next_id(collection_name: str) -> int:
-    counter = await db.counters.find_one_and_update(
-        {"_id": collection_name},
-        {"$inc": {"seq": 1}},
-        upsert=True,
-        return_document=True,
-    )
-    return counter["seq"]
+    allocator = _allocators.get(collection_name)
+    if allocator is None:
+        allocator = _allocators[collection_name] = IdAllocator(collection_name)
+    return await allocator.next_id()
+
+INDEXES = {
+    # Also backs the /cart/add upsert: concurrent adds for the same line
+    # collapse onto one document instead of racing to insert duplicates.
+    "cart_items": [
+        IndexModel([("user_id", ASCENDING), ("product_id", ASCENDING)], unique=True),
+    ],
+    # CART_STORAGE=document: one cart per user.
+    "carts": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "orders": [
+        # Serves GET /orders keyset pages on (created_at, id), newest first.
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Orders placed without a transaction whose event is not relayed yet.
+        IndexModel(
+            [("outbox_event.created_at", ASCENDING)],
+            partialFilterExpression={"outbox_event": {"$exists": True}},
+        ),
+    ],
+    "outbox": [
+        # One event per order, so a relay retried after a crash adds nothing.
+        IndexModel([("order_id", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=OUTBOX_RETENTION_SECONDS),
+    ],
+}
+
+async def ensure_indexes():
+    """Creates every index in ``INDEXES``; already-existing ones are no-ops.
+
+    Indexes are created one at a time so a failure (e.g. duplicate keys
+    blocking a unique index) does not keep the others from being built.
+    """
+    for collection, models in INDEXES.items():
+        for model in models:
+            try:
+                await db[collection].create_indexes([model])
+            except OperationFailure as exc:
+                logger.error(
+                    "Could not create index %s on %s: %s",
+                    model.document["name"], collection, exc,
+                )
+
+async def index_stats() -> dict:
+    pipeline = [
+        {"$indexStats": {}},
+        {"$project": {"_id": 0, "name": 1, "key": 1, "accesses": 1}},
+    ]
+    return {
+        collection: await db[collection].aggregate(pipeline).to_list(length=None)
+        for collection in INDEXES
+    }
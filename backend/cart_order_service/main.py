@@ -1,15 +1,61 @@
+import asyncio
+import logging
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from typing import Optional
 from fastapi import FastAPI, HTTPException, status, Query
 from fastapi.middleware.cors import CORSMiddleware
-from database import db, get_next_id
+from fastapi.responses import ORJSONResponse
+from pymongo import ReadPreference
+from pymongo.errors import PyMongoError
+from database import (
+    client, db, catalog_db, get_next_id, supports_transactions,
+    ensure_indexes, index_stats,
+)
+from pool import pool_metrics, warm_pool
+from metrics import MetricsMiddleware, metrics_response
+from admission import AdmissionController, AdmissionMiddleware
+from carts import create_cart_store
+from outbox import EMBEDDED_EVENT, order_placed_event, relay, run_relay
 from models import (
     CartAddRequest, CartRemoveRequest, CartItemResponse,
     OrderCreateRequest, OrderResponse, OrderItemResponse,
+    OrderSummaryResponse, OrderPage, OrderSummaryPage, projection,
 )
 
-app = FastAPI(title="Cart & Order Service", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+carts = create_cart_store(db, get_next_id)
+
+MAX_ORDER_PAGE_SIZE = 100
+DEFAULT_ORDER_PAGE_SIZE = 20
+
+SUMMARY_PROJECTION = {
+    **projection(OrderSummaryResponse),
+    "item_count": {"$size": {"$ifNull": ["$items", []]}},
+}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_pool(client)
+    await ensure_indexes()
+    relayer = asyncio.create_task(run_relay(db))
+    yield
+    relayer.cancel()
+    client.close()
+
+admission = AdmissionController({"POST /order/create": 32})
 
+app = FastAPI(
+    title="Cart & Order Service",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+app.add_middleware(AdmissionMiddleware, controller=admission)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -26,52 +72,29 @@ def root():
 def health():
     return {"status": "healthy", "service": "cart_order_service"}
 
-@app.post("/cart/add", response_model=CartItemResponse)
-async def add_to_cart(request: CartAddRequest):
-    existing = await db.cart_items.find_one(
-        {"user_id": request.user_id, "product_id": request.product_id}
-    )
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
 
-    if existing:
-        update_fields = {"$inc": {"quantity": request.quantity}}
-        set_fields = {}
-        if request.product_name:
-            set_fields["product_name"] = request.product_name
-        if request.product_price:
-            set_fields["product_price"] = request.product_price
-        if set_fields:
-            update_fields["$set"] = set_fields
-        await db.cart_items.update_one(
-            {"_id": existing["_id"]}, update_fields
-        )
-        updated = await db.cart_items.find_one({"_id": existing["_id"]})
-        return CartItemResponse(
-            id=updated["id"],
-            user_id=updated["user_id"],
-            product_id=updated["product_id"],
-            product_name=updated.get("product_name"),
-            product_price=updated.get("product_price"),
-            quantity=updated["quantity"],
-        )
+@app.get("/admin/admission-stats")
+def get_admission_stats():
+    return admission.stats()
 
-    item_id = await get_next_id("cart_items")
-    cart_doc = {
-        "id": item_id,
-        "user_id": request.user_id,
-        "product_id": request.product_id,
-        "product_name": request.product_name,
-        "product_price": request.product_price,
-        "quantity": request.quantity,
-    }
-    await db.cart_items.insert_one(cart_doc)
-    return CartItemResponse(**{k: v for k, v in cart_doc.items() if k != "_id"})
+@app.get("/admin/index-stats")
+async def get_index_stats():
+    return await index_stats()
+
+@app.get("/admin/pool-stats")
+def get_pool_stats():
+    return pool_metrics.stats()
+
+@app.post("/cart/add", response_model=CartItemResponse)
+async def add_to_cart(request: CartAddRequest):
+    return CartItemResponse(**await carts.add(request))
 
 @app.post("/cart/remove")
 async def remove_from_cart(request: CartRemoveRequest):
-    result = await db.cart_items.delete_one(
-        {"user_id": request.user_id, "product_id": request.product_id}
-    )
-    if result.deleted_count == 0:
+    if not await carts.remove(request.user_id, request.product_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Item not found in cart",
@@ -80,16 +103,10 @@ async def remove_from_cart(request: CartRemoveRequest):
 
 @app.get("/cart", response_model=list[CartItemResponse])
 async def get_cart(user_id: int = Query(...)):
-    items = await db.cart_items.find(
-        {"user_id": user_id}, {"_id": 0}
-    ).to_list(length=100)
-    return items
+    return ORJSONResponse(await carts.get(user_id, limit=100))
 
-@app.post("/order/create", response_model=OrderResponse)
-async def create_order(request: OrderCreateRequest):
-    cart_items = await db.cart_items.find(
-        {"user_id": request.user_id}
-    ).to_list(length=100)
+async def _place_order(user_id: int, order_id: int, order_ref: str, session=None) -> dict:
+    cart_items = await carts.items_for_order(user_id, session)
 
     if not cart_items:
         raise HTTPException(
@@ -97,30 +114,75 @@ async def create_order(request: OrderCreateRequest):
             detail="Cart is empty",
         )
 
-    total = sum((item.get("product_price") or 0) * item["quantity"] for item in cart_items)
-    order_ref = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-    order_id = await get_next_id("orders")
+    product_ids = [item["product_id"] for item in cart_items]
+    products = {
+        product["id"]: product
+        for product in await catalog_db.products.find(
+            {"id": {"$in": product_ids}},
+            {"_id": 0, "id": 1, "name": 1, "price": 1, "is_available": 1},
+            session=session,
+        ).to_list(length=None)
+    }
+    unavailable = [
+        product_id for product_id in product_ids
+        if not products.get(product_id, {}).get("is_available", False)
+    ]
+    if unavailable:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Products no longer available: {unavailable}",
+        )
 
     order_items = [
         {
             "product_id": item["product_id"],
-            "product_name": item.get("product_name"),
+            "product_name": products[item["product_id"]]["name"],
             "quantity": item["quantity"],
-            "price": item.get("product_price") or 0,
+            "price": products[item["product_id"]]["price"],
         }
         for item in cart_items
     ]
 
     order_doc = {
         "id": order_id,
-        "user_id": request.user_id,
+        "user_id": user_id,
         "order_ref": order_ref,
-        "total": total,
+        "total": sum(item["price"] * item["quantity"] for item in order_items),
         "created_at": datetime.now(timezone.utc),
         "items": order_items,
     }
-    await db.orders.insert_one(order_doc)
-    await db.cart_items.delete_many({"user_id": request.user_id})
+    # delivery_service creates the delivery record from this event. It is
+    # committed with the order: in the same transaction, or without one as
+    # part of the order document itself until relay() moves it.
+    event = order_placed_event(order_doc)
+    if session is None:
+        order_doc[EMBEDDED_EVENT] = event
+        await db.orders.insert_one(order_doc)
+    else:
+        await db.orders.insert_one(order_doc, session=session)
+        await db.outbox.insert_one(event, session=session)
+    await carts.clear(user_id, cart_items, session)
+    return order_doc
+
+@app.post("/order/create", response_model=OrderResponse)
+async def create_order(request: OrderCreateRequest):
+    order_ref = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+    order_id = await get_next_id("orders")
+
+    if await supports_transactions():
+        async with await client.start_session() as session:
+            # Transactions must read from the primary whatever MONGO_READ_PREFERENCE says.
+            order_doc = await session.with_transaction(
+                lambda s: _place_order(request.user_id, order_id, order_ref, s),
+                read_preference=ReadPreference.PRIMARY,
+            )
+    else:
+        order_doc = await _place_order(request.user_id, order_id, order_ref)
+        try:
+            await relay(db, [order_id])
+        except PyMongoError as exc:
+            # The order is placed; the background relay retries the event.
+            logger.warning("Could not relay outbox event for order %s: %s", order_id, exc)
 
     return OrderResponse(
         id=order_doc["id"],
@@ -128,24 +190,65 @@ async def create_order(request: OrderCreateRequest):
         order_ref=order_doc["order_ref"],
         total=order_doc["total"],
         created_at=order_doc["created_at"],
-        items=[OrderItemResponse(**item) for item in order_items],
+        items=[OrderItemResponse(**item) for item in order_doc["items"]],
     )
 
-@app.get("/orders", response_model=list[OrderResponse])
-async def get_orders(user_id: int = Query(...)):
-    orders = await db.orders.find(
-        {"user_id": user_id}, {"_id": 0}
-    ).sort("created_at", -1).to_list(length=100)
-
-    result = []
-    for order in orders:
-        items = [OrderItemResponse(**item) for item in order.get("items", [])]
-        result.append(OrderResponse(
-            id=order["id"],
-            user_id=order["user_id"],
-            order_ref=order["order_ref"],
-            total=order["total"],
-            created_at=order["created_at"],
-            items=items,
-        ))
-    return result
+def _encode_cursor(order: dict) -> str:
+    created_at = order["created_at"]
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return f"{int(created_at.timestamp() * 1000)}_{order['id']}"
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        millis, order_id = (int(part) for part in cursor.split("_"))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc), order_id
+
+@app.get(
+    "/orders",
+    response_model=list[OrderResponse] | OrderPage | OrderSummaryPage,
+)
+async def get_orders(
+    user_id: int = Query(...),
+    cursor: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_ORDER_PAGE_SIZE),
+    summary: bool = Query(False),
+):
+    query = {"user_id": user_id}
+    fields = SUMMARY_PROJECTION if summary else projection(OrderResponse)
+    sort = [("created_at", -1), ("id", -1)]
+
+    if cursor is None and limit is None and not summary:
+        orders = await db.orders.find(query, fields).sort(sort).to_list(length=MAX_ORDER_PAGE_SIZE)
+        return ORJSONResponse(orders)
+
+    if cursor is not None:
+        created_at, order_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": order_id}},
+        ]
+    page_size = limit or DEFAULT_ORDER_PAGE_SIZE
+    orders = await db.orders.find(query, fields).sort(sort).limit(page_size + 1).to_list(length=None)
+    next_cursor = None
+    if len(orders) > page_size:
+        orders = orders[:page_size]
+        next_cursor = _encode_cursor(orders[-1])
+    return ORJSONResponse({"items": orders, "next_cursor": next_cursor})
+
+@app.get("/orders/{order_id}", response_model=OrderResponse)
+async def get_order(order_id: int, user_id: int = Query(...)):
+    order = await db.orders.find_one(
+        {"id": order_id, "user_id": user_id}, projection(OrderResponse)
+    )
+    if not order:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Order not found",
+        )
+    return ORJSONResponse(order)
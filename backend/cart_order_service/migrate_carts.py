@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+from pymongo import ReplaceOne
+from database import client, db
+
+async def migrate(batch_size: int, delete_lines: bool):
+    """Copies every cart from ``cart_items`` lines into one ``carts`` document
+    per user, for switching to ``CART_STORAGE=document``.
+
+    Run it with the service stopped or still on ``CART_STORAGE=lines``: each
+    user's ``carts`` document is replaced by what ``cart_items`` holds, so it
+    is safe to re-run but would overwrite carts already written in document
+    mode. ``--delete-lines`` removes the copied lines afterwards.
+    """
+    pipeline = [
+        {"$sort": {"user_id": 1, "id": 1}},
+        {"$group": {
+            "_id": "$user_id",
+            "items": {"$push": {
+                "id": "$product_id",
+                "product_id": "$product_id",
+                "product_name": "$product_name",
+                "product_price": "$product_price",
+                "quantity": "$quantity",
+            }},
+        }},
+    ]
+    migrated = 0
+    batch = []
+
+    async def flush():
+        nonlocal migrated
+        if not batch:
+            return
+        await db.carts.bulk_write(batch, ordered=False)
+        migrated += len(batch)
+        batch.clear()
+
+    async for cart in db.cart_items.aggregate(pipeline, allowDiskUse=True):
+        batch.append(ReplaceOne(
+            {"user_id": cart["_id"]},
+            {"user_id": cart["_id"], "items": cart["items"]},
+            upsert=True,
+        ))
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+    print(f"Migrated {migrated} carts")
+
+    if delete_lines:
+        result = await db.cart_items.delete_many({})
+        print(f"Deleted {result.deleted_count} cart lines")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move carts from cart_items lines to one carts document per user")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--delete-lines", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.delete_lines))
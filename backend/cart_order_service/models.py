@@ -36,3 +36,23 @@ class OrderResponse(BaseModel):
     total: float
     created_at: datetime
     items: list[OrderItemResponse]
+
+class OrderSummaryResponse(BaseModel):
+    id: int
+    order_ref: str
+    total: float
+    created_at: datetime
+    item_count: int
+
+class OrderPage(BaseModel):
+    items: list[OrderResponse]
+    next_cursor: str | None
+
+class OrderSummaryPage(BaseModel):
+    items: list[OrderSummaryResponse]
+    next_cursor: str | None
+
+def projection(model: type[BaseModel]) -> dict:
+    """MongoDB projection returning exactly ``model``'s fields, so documents
+    written by this service can be sent as-is without re-validation."""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
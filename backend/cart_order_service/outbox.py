@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Field of an order written without a transaction that holds its event
+# until relay() has copied it to the outbox.
+EMBEDDED_EVENT = "outbox_event"
+OUTBOX_RELAY_INTERVAL_SECONDS = float(os.getenv("OUTBOX_RELAY_INTERVAL_SECONDS", "1"))
+OUTBOX_RELAY_BATCH_SIZE = 500
+DUPLICATE_KEY = 11000
+
+def order_placed_event(order_doc: dict) -> dict:
+    return {
+        "type": "order_placed",
+        "order_id": order_doc["id"],
+        "user_id": order_doc["user_id"],
+        "total": order_doc["total"],
+        "created_at": order_doc["created_at"],
+    }
+
+async def relay(db, order_ids: list[int] | None = None) -> int:
+    """Copies events embedded in orders to the outbox, then removes them
+    from the orders; returns how many orders it handled.
+
+    The copies get fresh ``_id``s, since consumers read the outbox in
+    ``_id`` order and these events only become visible there now. An event
+    copied before a crash is skipped via the unique ``order_id`` index.
+    """
+    query = {EMBEDDED_EVENT: {"$exists": True}}
+    if order_ids is not None:
+        query["id"] = {"$in": order_ids}
+    orders = await db.orders.find(
+        query, {"_id": 0, "id": 1, EMBEDDED_EVENT: 1}
+    ).sort(f"{EMBEDDED_EVENT}.created_at", 1).limit(OUTBOX_RELAY_BATCH_SIZE).to_list(length=None)
+    if not orders:
+        return 0
+    try:
+        await db.outbox.insert_many([order[EMBEDDED_EVENT] for order in orders], ordered=False)
+    except BulkWriteError as exc:
+        if any(error["code"] != DUPLICATE_KEY for error in exc.details["writeErrors"]):
+            raise
+    await db.orders.update_many(
+        {"id": {"$in": [order["id"] for order in orders]}},
+        {"$unset": {EMBEDDED_EVENT: ""}},
+    )
+    return len(orders)
+
+async def run_relay(db):
+    """Relays events left embedded in orders, e.g. by a crash right after
+    a checkout on a standalone server."""
+    while True:
+        try:
+            relayed = await relay(db)
+        except PyMongoError as exc:
+            logger.warning("Could not relay outbox events: %s", exc)
+            relayed = 0
+        if relayed < OUTBOX_RELAY_BATCH_SIZE:
+            await asyncio.sleep(OUTBOX_RELAY_INTERVAL_SECONDS)
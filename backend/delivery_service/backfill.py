@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import os
+from pymongo.errors import BulkWriteError
+from database import client, db, get_next_id
+
+ORDERS_DB_NAME = os.getenv("ORDERS_DB_NAME", "thriftapp_cart_orders")
+DUPLICATE_KEY = 11000
+
+async def backfill(batch_size: int):
+    """Creates a PLACED delivery record for every order that has none.
+
+    The outbox worker creates these records; this covers orders placed
+    before it existed or whose events expired while it was down. Safe to
+    re-run: records that appear concurrently are skipped via
+    the unique ``order_id`` index.
+    """
+    orders = client[ORDERS_DB_NAME].orders
+    created = 0
+    batch = []
+
+    async def flush():
+        nonlocal created
+        if not batch:
+            return
+        order_ids = [order["id"] for order in batch]
+        existing = {
+            doc["order_id"]
+            for doc in await db.delivery_statuses.find(
+                {"order_id": {"$in": order_ids}}, {"_id": 0, "order_id": 1}
+            ).to_list(length=None)
+        }
+        docs = [
+            {
+                "id": await get_next_id("delivery_statuses"),
+                "order_id": order["id"],
+                "status": "PLACED",
+                "updated_at": order["created_at"],
+            }
+            for order in batch
+            if order["id"] not in existing
+        ]
+        batch.clear()
+        if not docs:
+            return
+        try:
+            result = await db.delivery_statuses.insert_many(docs, ordered=False)
+            created += len(result.inserted_ids)
+        except BulkWriteError as exc:
+            if any(error["code"] != DUPLICATE_KEY for error in exc.details["writeErrors"]):
+                raise
+            created += exc.details["nInserted"]
+
+    async for order in orders.find({}, {"_id": 0, "id": 1, "created_at": 1}).sort("id", 1):
+        batch.append(order)
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+
+    print(f"Created {created} delivery records")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create missing delivery records for existing orders")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(backfill(args.batch_size))
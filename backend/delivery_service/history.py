@@ -0,0 +1,125 @@
+import bisect
+import logging
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+EVENTS_COLLECTION = "status_events"
+ROLLUP_COLLECTION = "status_dwell_hourly"
+
+# Upper bounds (seconds) of the dwell-time histogram kept per stage and hour;
+# anything longer lands in a final overflow bucket.
+DWELL_BUCKETS = [
+    30, 60, 120, 300, 600, 900, 1800, 3600, 2 * 3600, 4 * 3600, 8 * 3600, 24 * 3600, 48 * 3600,
+]
+
+def _as_utc(value: datetime) -> datetime:
+    # Documents read back from MongoDB carry naive UTC datetimes.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+async def ensure_events_collection(db):
+    try:
+        await db.create_collection(
+            EVENTS_COLLECTION,
+            timeseries={"timeField": "at", "metaField": "meta", "granularity": "minutes"},
+        )
+    except CollectionInvalid:
+        pass
+    except OperationFailure as exc:
+        logger.error("Could not create %s time-series collection: %s", EVENTS_COLLECTION, exc)
+
+async def record_transitions(db, transitions: list[tuple[dict, str]], now: datetime):
+    """Appends one event per ``(delivery_before_update, new_status)`` and adds
+    the time spent in the previous status to that stage's hourly rollup.
+
+    The status change itself is already committed, so failures here are
+    logged rather than raised.
+    """
+    events = []
+    rollups = []
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    for delivery, new_status in transitions:
+        dwell = (now - _as_utc(delivery["updated_at"])).total_seconds()
+        events.append({
+            "at": now,
+            "meta": {"order_id": delivery["order_id"]},
+            "from_status": delivery["status"],
+            "to_status": new_status,
+            "dwell_seconds": dwell,
+        })
+        bucket = bisect.bisect_left(DWELL_BUCKETS, dwell)
+        rollups.append(UpdateOne(
+            {"hour": hour, "stage": delivery["status"]},
+            {
+                "$inc": {"count": 1, "dwell_seconds_sum": dwell, f"buckets.{bucket}": 1},
+                "$min": {"dwell_seconds_min": dwell},
+                "$max": {"dwell_seconds_max": dwell},
+            },
+            upsert=True,
+        ))
+    if not events:
+        return
+    try:
+        await db[EVENTS_COLLECTION].insert_many(events, ordered=False)
+        await db[ROLLUP_COLLECTION].bulk_write(rollups, ordered=False)
+    except PyMongoError as exc:
+        logger.warning("Could not record %d status transitions: %s", len(events), exc)
+
+def _percentile(buckets: list[int], count: int, pct: float, low: float, high: float) -> float:
+    """Estimates a percentile by interpolating within the histogram bucket,
+    clamped to the smallest and largest dwell actually seen (``low``,
+    ``high``) since the buckets are much wider than most dwell times."""
+    return min(max(_interpolate(buckets, count, pct), low), high)
+
+def _interpolate(buckets: list[int], count: int, pct: float) -> float:
+    target = pct / 100 * count
+    seen = 0
+    for index, bucket_count in enumerate(buckets):
+        if bucket_count and seen + bucket_count >= target:
+            lower = DWELL_BUCKETS[index - 1] if index else 0
+            if index == len(DWELL_BUCKETS):
+                return float(lower)
+            fraction = (target - seen) / bucket_count
+            return lower + fraction * (DWELL_BUCKETS[index] - lower)
+        seen += bucket_count
+    return 0.0
+
+async def dwell_time_summary(db, since: datetime, until: datetime, stages: list[str]) -> list[dict]:
+    """Per-stage dwell statistics for transitions between ``since`` and ``until``,
+    read from the hourly rollups (hour granularity)."""
+    totals = {}
+    async for rollup in db[ROLLUP_COLLECTION].find(
+        {"hour": {"$gte": since.replace(minute=0, second=0, microsecond=0), "$lt": until}},
+        {"_id": 0},
+    ):
+        stage = totals.setdefault(rollup["stage"], {
+            "count": 0, "sum": 0.0, "buckets": [0] * (len(DWELL_BUCKETS) + 1),
+            "min": float("inf"), "max": float("-inf"),
+        })
+        stage["count"] += rollup["count"]
+        stage["sum"] += rollup["dwell_seconds_sum"]
+        # Rollups written before min/max were tracked leave the bounds open.
+        stage["min"] = min(stage["min"], rollup.get("dwell_seconds_min", float("-inf")))
+        stage["max"] = max(stage["max"], rollup.get("dwell_seconds_max", float("inf")))
+        for index, bucket_count in rollup.get("buckets", {}).items():
+            stage["buckets"][int(index)] += bucket_count
+
+    summary = []
+    for name in stages:
+        stage = totals.get(name)
+        if stage is None:
+            continue
+        summary.append({
+            "stage": name,
+            "transitions": stage["count"],
+            "mean_seconds": round(stage["sum"] / stage["count"], 1),
+            "p50_seconds": round(_percentile(
+                stage["buckets"], stage["count"], 50, stage["min"], stage["max"],
+            ), 1),
+            "p95_seconds": round(_percentile(
+                stage["buckets"], stage["count"], 95, stage["min"], stage["max"],
+            ), 1),
+        })
+    return summary
@@ -1,11 +1,53 @@
-from datetime import datetime, timezone
-from fastapi import FastAPI, HTTPException, status
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
-from database import db, get_next_id
-from models import DeliveryStatusResponse, StatusUpdateRequest, STATUS_FLOW
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pymongo import UpdateOne
+from database import client, db, status_reads, ensure_indexes, index_stats
+from pool import pool_metrics, warm_pool
+from metrics import MetricsMiddleware, metrics_response
+from admission import AdmissionController, AdmissionMiddleware
+from models import (
+    DeliveryStatusResponse, StatusUpdateRequest, STATUS_FLOW,
+    BulkStatusUpdateRequest, BulkStatusUpdateResponse, BulkStatusUpdateResult,
+)
+from status_feed import broker, status_updates, watch_statuses
+from history import dwell_time_summary, ensure_events_collection, record_transitions
+from outbox import outbox_worker
+from typing import Optional
+
+MAX_BULK_UPDATES = 1000
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_pool(client)
+    await ensure_indexes()
+    await ensure_events_collection(db)
+    watcher = asyncio.create_task(watch_statuses(db.delivery_statuses))
+    drainer = asyncio.create_task(outbox_worker.run())
+    yield
+    drainer.cancel()
+    watcher.cancel()
+    client.close()
 
-app = FastAPI(title="Delivery & Order Status Service", version="1.0.0")
+admission = AdmissionController({
+    "POST /orders/update-status": 8,
+    # Streams hold a request open for minutes; never queue them behind a cap.
+    "GET /order/{order_id}/status/stream": 0,
+})
 
+app = FastAPI(
+    title="Delivery & Order Status Service",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+app.add_middleware(AdmissionMiddleware, controller=admission)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -22,20 +64,59 @@ def root():
 def health():
     return {"status": "healthy", "service": "delivery_service"}
 
-@app.get("/order/{order_id}/status", response_model=DeliveryStatusResponse)
-async def get_order_status(order_id: int):
-    delivery = await db.delivery_statuses.find_one({"order_id": order_id})
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
+
+@app.get("/admin/admission-stats")
+def get_admission_stats():
+    return admission.stats()
+
+@app.get("/admin/index-stats")
+async def get_index_stats():
+    return await index_stats()
+
+@app.get("/admin/pool-stats")
+def get_pool_stats():
+    return pool_metrics.stats()
 
+@app.get("/admin/outbox-stats")
+def get_outbox_stats():
+    return outbox_worker.stats()
+
+@app.get("/stream/stats")
+def get_stream_stats():
+    return broker.stats()
+
+async def _find_delivery(order_id: int, collection=None) -> dict:
+    """Reads an order's record without side effects, so status reads can be
+    served by ``status_reads`` (possibly a secondary)."""
+    # Looked up per call rather than bound as a default, so the read
+    # collection can be swapped after import.
+    if collection is None:
+        collection = status_reads
+    delivery = await collection.find_one({"order_id": order_id})
+    if not delivery:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Delivery status not found",
+        )
+    return delivery
+
+async def _find_delivery_to_update(order_id: int) -> dict:
+    """Reads an order's record from the primary for a write, creating it
+    from the outbox first if the worker has not got to it yet."""
+    delivery = await db.delivery_statuses.find_one({"order_id": order_id})
+    if not delivery and await outbox_worker.catch_up([order_id]):
+        delivery = await db.delivery_statuses.find_one({"order_id": order_id})
     if not delivery:
-        doc_id = await get_next_id("delivery_statuses")
-        delivery = {
-            "id": doc_id,
-            "order_id": order_id,
-            "status": "PLACED",
-            "updated_at": datetime.now(timezone.utc),
-        }
-        await db.delivery_statuses.insert_one(delivery)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Delivery status not found",
+        )
+    return delivery
 
+def _to_response(delivery: dict) -> DeliveryStatusResponse:
     return DeliveryStatusResponse(
         id=delivery["id"],
         order_id=delivery["order_id"],
@@ -43,45 +124,206 @@ async def get_order_status(order_id: int):
         updated_at=delivery["updated_at"],
     )
 
+@app.get("/analytics/dwell-times")
+async def get_dwell_times(
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+):
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(hours=24)
+    return {
+        "since": since,
+        "until": until,
+        "stages": await dwell_time_summary(db, since, until, STATUS_FLOW),
+    }
+
+@app.get("/order/{order_id}/status", response_model=DeliveryStatusResponse)
+async def get_order_status(order_id: int):
+    try:
+        delivery = await _find_delivery(order_id)
+    except HTTPException:
+        if await outbox_worker.pending(order_id):
+            # Placed, but the outbox worker has not created the record yet.
+            return ORJSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={"detail": "Delivery status pending, retry shortly"},
+                headers={"Retry-After": "1"},
+            )
+        raise
+    return _to_response(delivery)
+
+async def _sse_events(order_id: int, current: dict, queue):
+    async for delivery in status_updates(order_id, current, queue):
+        if delivery is None:
+            yield ": keep-alive\n\n"
+        else:
+            yield f"event: status\ndata: {_to_response(delivery).model_dump_json()}\n\n"
+
+@app.get("/order/{order_id}/status/stream")
+async def stream_order_status(order_id: int):
+    # Subscribe before reading, so an update in between is still streamed.
+    queue = broker.subscribe(order_id)
+    try:
+        delivery = await _find_delivery(order_id)
+    except HTTPException:
+        broker.unsubscribe(order_id, queue)
+        raise
+    return StreamingResponse(
+        _sse_events(order_id, delivery, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Runs even if the client leaves before the stream starts.
+        background=BackgroundTask(broker.unsubscribe, order_id, queue),
+    )
+
+@app.websocket("/order/{order_id}/status/ws")
+async def order_status_socket(websocket: WebSocket, order_id: int):
+    queue = broker.subscribe(order_id)
+    try:
+        try:
+            current = await _find_delivery(order_id)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Delivery status not found")
+            return
+        await websocket.accept()
+        try:
+            async for delivery in status_updates(order_id, current, queue):
+                if delivery is None:
+                    await websocket.send_json({"type": "keep-alive"})
+                else:
+                    await websocket.send_text(_to_response(delivery).model_dump_json())
+        except WebSocketDisconnect:
+            return
+        await websocket.close()
+    finally:
+        broker.unsubscribe(order_id, queue)
+
+def _next_status(current: str, requested: str | None) -> str:
+    """Validates a transition; ``requested=None`` advances along STATUS_FLOW.
+
+    Statuses only move forward (skipping ahead is allowed), so the transition
+    history never records a step back or a no-op.
+    """
+    current_index = STATUS_FLOW.index(current)
+    if requested:
+        if requested not in STATUS_FLOW:
+            raise ValueError(f"Invalid status. Must be one of: {STATUS_FLOW}")
+        if STATUS_FLOW.index(requested) <= current_index:
+            raise ValueError(f"Order is already {current}; cannot move to {requested}")
+        return requested
+    if current_index >= len(STATUS_FLOW) - 1:
+        raise ValueError("Order is already delivered")
+    return STATUS_FLOW[current_index + 1]
+
 @app.post("/order/{order_id}/update-status", response_model=DeliveryStatusResponse)
 async def update_order_status(order_id: int, request: StatusUpdateRequest = None):
-    delivery = await db.delivery_statuses.find_one({"order_id": order_id})
+    delivery = await _find_delivery_to_update(order_id)
 
-    if not delivery:
-        doc_id = await get_next_id("delivery_statuses")
-        delivery = {
-            "id": doc_id,
-            "order_id": order_id,
-            "status": "PLACED",
-            "updated_at": datetime.now(timezone.utc),
-        }
-        await db.delivery_statuses.insert_one(delivery)
-
-    if request and request.status:
-        if request.status not in STATUS_FLOW:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid status. Must be one of: {STATUS_FLOW}",
-            )
-        new_status = request.status
-    else:
-        current_index = STATUS_FLOW.index(delivery["status"])
-        if current_index >= len(STATUS_FLOW) - 1:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Order is already delivered",
-            )
-        new_status = STATUS_FLOW[current_index + 1]
+    try:
+        new_status = _next_status(delivery["status"], request.status if request else None)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        )
 
     now = datetime.now(timezone.utc)
-    await db.delivery_statuses.update_one(
-        {"order_id": order_id},
+    # Only applies if nobody changed the status since the read above.
+    result = await db.delivery_statuses.update_one(
+        {"order_id": order_id, "status": delivery["status"]},
         {"$set": {"status": new_status, "updated_at": now}},
     )
+    if result.matched_count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Status changed concurrently, retry",
+        )
+    await record_transitions(db, [(delivery, new_status)], now)
+    delivery.update(status=new_status, updated_at=now)
+    broker.publish(delivery)
 
-    return DeliveryStatusResponse(
-        id=delivery["id"],
-        order_id=order_id,
-        status=new_status,
-        updated_at=now,
+    return _to_response(delivery)
+
+@app.post("/orders/update-status", response_model=BulkStatusUpdateResponse)
+async def bulk_update_order_status(request: BulkStatusUpdateRequest):
+    if len(request.updates) > MAX_BULK_UPDATES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_UPDATES} updates per request",
+        )
+
+    order_ids = [item.order_id for item in request.updates]
+    deliveries = {
+        delivery["order_id"]: delivery
+        for delivery in await db.delivery_statuses.find(
+            {"order_id": {"$in": order_ids}}
+        ).to_list(length=None)
+    }
+    missing = [order_id for order_id in order_ids if order_id not in deliveries]
+    if missing and await outbox_worker.catch_up(missing):
+        for delivery in await db.delivery_statuses.find(
+            {"order_id": {"$in": missing}}
+        ).to_list(length=None):
+            deliveries[delivery["order_id"]] = delivery
+
+    now = datetime.now(timezone.utc)
+    results = []
+    operations = []
+    applied = []
+    seen = set()
+    for item in request.updates:
+        delivery = deliveries.get(item.order_id)
+        error = None
+        if item.order_id in seen:
+            error = "Duplicate order_id in batch"
+        elif delivery is None:
+            error = "Delivery status not found"
+        else:
+            try:
+                new_status = _next_status(delivery["status"], item.status)
+            except ValueError as exc:
+                error = str(exc)
+        seen.add(item.order_id)
+        if error:
+            results.append(BulkStatusUpdateResult(order_id=item.order_id, ok=False, error=error))
+            continue
+
+        # Only applies if nobody changed the status since the read above.
+        operations.append(UpdateOne(
+            {"order_id": item.order_id, "status": delivery["status"]},
+            {"$set": {"status": new_status, "updated_at": now}},
+        ))
+        result = BulkStatusUpdateResult(
+            order_id=item.order_id, ok=True, status=new_status, updated_at=now,
+        )
+        results.append(result)
+        applied.append((delivery, result))
+
+    if operations:
+        outcome = await db.delivery_statuses.bulk_write(operations, ordered=False)
+        if outcome.matched_count < len(operations):
+            # Some statuses moved underneath us; find which writes landed.
+            landed = {
+                doc["order_id"]
+                for doc in await db.delivery_statuses.find(
+                    {"order_id": {"$in": [d["order_id"] for d, _ in applied]}, "updated_at": now},
+                    {"_id": 0, "order_id": 1},
+                ).to_list(length=None)
+            }
+            for _, result in applied:
+                if result.order_id not in landed:
+                    result.ok, result.status, result.updated_at = False, None, None
+                    result.error = "Status changed concurrently, retry"
+
+    applied = [(delivery, result) for delivery, result in applied if result.ok]
+    await record_transitions(
+        db, [(delivery, result.status) for delivery, result in applied], now,
+    )
+    for delivery, result in applied:
+        delivery.update(status=result.status, updated_at=now)
+        broker.publish(delivery)
+
+    updated = sum(result.ok for result in results)
+    return BulkStatusUpdateResponse(
+        updated=updated, failed=len(results) - updated, results=results,
     )
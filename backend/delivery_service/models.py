@@ -11,3 +11,23 @@ class DeliveryStatusResponse(BaseModel):
 
 class StatusUpdateRequest(BaseModel):
     status: str | None = None
+
+class BulkStatusUpdateItem(BaseModel):
+    order_id: int
+    # None advances to the next status in STATUS_FLOW.
+    status: str | None = None
+
+class BulkStatusUpdateRequest(BaseModel):
+    updates: list[BulkStatusUpdateItem]
+
+class BulkStatusUpdateResult(BaseModel):
+    order_id: int
+    ok: bool
+    status: str | None = None
+    updated_at: datetime | None = None
+    error: str | None = None
+
+class BulkStatusUpdateResponse(BaseModel):
+    updated: int
+    failed: int
+    results: list[BulkStatusUpdateResult]
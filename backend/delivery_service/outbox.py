@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from prometheus_client import Counter, Gauge, Histogram
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from database import client, db, get_next_id
+
+logger = logging.getLogger(__name__)
+
+ORDERS_DB_NAME = os.getenv("ORDERS_DB_NAME", "thriftapp_cart_orders")
+# Key of this consumer's checkpoint in ``outbox_checkpoints``.
+OUTBOX_CONSUMER = "delivery"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "1"))
+# Events are read again until their _id is this old, so one committed late
+# behind a newer _id (a slow transaction, a skewed clock) is never skipped.
+OUTBOX_SETTLE_SECONDS = float(os.getenv("OUTBOX_SETTLE_SECONDS", "10"))
+DUPLICATE_KEY = 11000
+
+OUTBOX_PROCESSED = Counter(
+    "outbox_events_processed_total", "Outbox events that created a record", ["consumer"],
+)
+OUTBOX_LAG = Gauge(
+    "outbox_lag_seconds", "Age of the oldest event applied in the last pass", ["consumer"],
+)
+OUTBOX_BATCH = Histogram(
+    "outbox_batch_size", "Outbox events read per batch", ["consumer"],
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+def delivery_record(event: dict, delivery_id: int) -> dict:
+    """The PLACED delivery record an ``order_placed`` event stands for."""
+    return {
+        "id": delivery_id,
+        "order_id": event["order_id"],
+        "status": "PLACED",
+        "updated_at": event["created_at"],
+    }
+
+def _age_seconds(created_at: datetime) -> float:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (datetime.now(timezone.utc) - created_at).total_seconds())
+
+class OutboxWorker:
+    """Creates delivery records from cart_order_service's ``order_placed``
+    outbox events, a batch per ``bulk_write``.
+
+    The outbox is only read. Progress is a checkpoint ``_id`` kept in this
+    service's ``outbox_checkpoints``; each pass reads the events after it
+    and moves it up to the newest event older than
+    ``OUTBOX_SETTLE_SECONDS``. Delivery is at least once: events are read
+    again until the checkpoint passes them, and a record is created only
+    for an order that has none (upsert by ``order_id``), so replays and
+    concurrent replicas change nothing.
+    """
+
+    def __init__(self, outbox, deliveries, checkpoints, next_id):
+        self.outbox = outbox
+        self.deliveries = deliveries
+        self.checkpoints = checkpoints
+        self.next_id = next_id
+        self.mode = "polling"
+        self.processed = 0
+        self.batches = 0
+        self.lag_seconds = 0.0
+        self._wake = asyncio.Event()
+
+    async def apply(self, events: list[dict]) -> list[dict]:
+        """Creates records for the orders among ``events`` that have none;
+        returns the events it created them for."""
+        existing = {
+            delivery["order_id"]
+            for delivery in await self.deliveries.find(
+                {"order_id": {"$in": [event["order_id"] for event in events]}},
+                {"_id": 0, "order_id": 1},
+            ).to_list(length=None)
+        }
+        new = [event for event in events if event["order_id"] not in existing]
+        if not new:
+            return new
+        operations = [
+            UpdateOne(
+                {"order_id": event["order_id"]},
+                {"$setOnInsert": delivery_record(event, await self.next_id())},
+                upsert=True,
+            )
+            for event in new
+        ]
+        try:
+            await self.deliveries.bulk_write(operations, ordered=False)
+        except BulkWriteError as exc:
+            # Concurrent upserts for one order: the record exists either way.
+            if any(error["code"] != DUPLICATE_KEY for error in exc.details["writeErrors"]):
+                raise
+        self.processed += len(new)
+        OUTBOX_PROCESSED.labels(OUTBOX_CONSUMER).inc(len(new))
+        return new
+
+    async def drain_once(self) -> int:
+        """Applies every event after the checkpoint; returns how many records
+        were created."""
+        checkpoint = await self.checkpoints.find_one({"_id": OUTBOX_CONSUMER})
+        settled = ObjectId.from_datetime(
+            datetime.now(timezone.utc) - timedelta(seconds=OUTBOX_SETTLE_SECONDS)
+        )
+        query = {"_id": {"$gt": checkpoint["after"]}} if checkpoint else {}
+        created = 0
+        lag = 0.0
+        while True:
+            events = await self.outbox.find(query).sort("_id", 1).limit(
+                OUTBOX_BATCH_SIZE
+            ).to_list(length=None)
+            if not events:
+                break
+            self.batches += 1
+            OUTBOX_BATCH.labels(OUTBOX_CONSUMER).observe(len(events))
+            applied = await self.apply(events)
+            if applied and not created:
+                lag = _age_seconds(applied[0]["created_at"])
+            created += len(applied)
+            newest_settled = next(
+                (event["_id"] for event in reversed(events) if event["_id"] <= settled), None,
+            )
+            if newest_settled is not None:
+                await self.checkpoints.update_one(
+                    {"_id": OUTBOX_CONSUMER}, {"$max": {"after": newest_settled}}, upsert=True,
+                )
+            if len(events) < OUTBOX_BATCH_SIZE:
+                break
+            query = {"_id": {"$gt": events[-1]["_id"]}}
+
+        self.lag_seconds = lag
+        OUTBOX_LAG.labels(OUTBOX_CONSUMER).set(lag)
+        return created
+
+    async def catch_up(self, order_ids: list[int]) -> int:
+        """Applies the events for ``order_ids`` now, for status updates that need
+        an order's record before the worker gets to it. Returns how many of
+        the orders have an event."""
+        events = await self.outbox.find(
+            {"order_id": {"$in": order_ids}}
+        ).to_list(length=None)
+        if events:
+            await self.apply(events)
+        return len(events)
+
+    async def pending(self, order_id: int) -> bool:
+        """Whether ``order_id`` has an event, i.e. was placed; only reads."""
+        return await self.outbox.find_one({"order_id": order_id}, {"_id": 1}) is not None
+
+    async def _watch(self):
+        """Wakes the worker on each new event; without change streams it
+        just polls every ``OUTBOX_POLL_INTERVAL_SECONDS``."""
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        while True:
+            try:
+                async with self.outbox.watch(pipeline) as stream:
+                    self.mode = "change_stream"
+                    async for _ in stream:
+                        self._wake.set()
+            except OperationFailure as exc:
+                logger.info("Change streams unavailable (%s); outbox is polled", exc)
+                self.mode = "polling"
+                return
+            except PyMongoError as exc:
+                logger.warning("Outbox change stream interrupted: %s", exc)
+                self.mode = "polling"
+                await asyncio.sleep(1)
+
+    async def run(self):
+        watcher = asyncio.create_task(self._watch())
+        try:
+            while True:
+                self._wake.clear()
+                try:
+                    await self.drain_once()
+                except PyMongoError as exc:
+                    logger.warning("Could not drain outbox: %s", exc)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), OUTBOX_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watcher.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "consumer": OUTBOX_CONSUMER,
+            "mode": self.mode,
+            "processed": self.processed,
+            "batches": self.batches,
+            "lag_seconds": self.lag_seconds,
+            "batch_size": OUTBOX_BATCH_SIZE,
+            "settle_seconds": OUTBOX_SETTLE_SECONDS,
+        }
+
+outbox_worker = OutboxWorker(
+    client[ORDERS_DB_NAME].outbox,
+    db.delivery_statuses,
+    db.outbox_checkpoints,
+    lambda: get_next_id("delivery_statuses"),
+)
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "8"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+STREAM_IDLE_TIMEOUT_SECONDS = float(os.getenv("STREAM_IDLE_TIMEOUT_SECONDS", "300"))
+
+feed_state = {"mode": "local"}
+
+class StatusBroker:
+    """In-process pub/sub of delivery status documents, keyed by order id.
+
+    Every subscriber gets its own bounded queue. A subscriber that falls
+    behind loses its oldest queued updates rather than holding up publishers;
+    statuses are snapshots, so the newest one is all a client needs.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped = 0
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    def subscribe(self, order_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(order_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, order_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(order_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[order_id]
+
+    def publish(self, delivery: dict):
+        self.published += 1
+        for queue in self._subscribers.get(delivery["order_id"], ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(delivery)
+
+    def stats(self) -> dict:
+        return {
+            "orders_watched": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+            "feed": feed_state["mode"],
+        }
+
+broker = StatusBroker(STREAM_QUEUE_SIZE)
+
+async def watch_statuses(collection):
+    """Publishes status writes made by any replica of the service.
+
+    Updates made by this process are already published directly, so on a
+    standalone server (no change streams) the feed stays local-only.
+    """
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+    while True:
+        try:
+            async with collection.watch(pipeline, full_document="updateLookup") as stream:
+                feed_state["mode"] = "change_stream"
+                async for change in stream:
+                    delivery = change.get("fullDocument")
+                    if delivery is not None:
+                        broker.publish(delivery)
+        except OperationFailure as exc:
+            logger.info("Change streams unavailable (%s); status feed is local only", exc)
+            feed_state["mode"] = "local"
+            return
+        except PyMongoError as exc:
+            logger.warning("Delivery status change stream interrupted: %s", exc)
+            await asyncio.sleep(1)
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+async def status_updates(order_id: int, current: dict, queue: asyncio.Queue):
+    """Yields ``current`` and then each newer status for ``order_id``.
+
+    ``queue`` must be subscribed to ``order_id`` before ``current`` was read,
+    so an update committed in between is not lost; the caller unsubscribes
+    it. Yields ``None`` every ``STREAM_HEARTBEAT_SECONDS`` without an update
+    so the caller can keep the connection alive, and stops after
+    ``STREAM_IDLE_TIMEOUT_SECONDS`` without one or once the order is delivered.
+    """
+    last = current
+    yield current
+    if current["status"] == "DELIVERED":
+        return
+    loop = asyncio.get_running_loop()
+    idle_deadline = loop.time() + STREAM_IDLE_TIMEOUT_SECONDS
+    while True:
+        timeout = min(STREAM_HEARTBEAT_SECONDS, idle_deadline - loop.time())
+        if timeout <= 0:
+            return
+        try:
+            delivery = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            yield None
+            continue
+        # Skips updates already reflected in ``current`` and the same write
+        # arriving from both the local publish and the change stream.
+        if (
+            delivery["status"] == last["status"]
+            or _utc(delivery["updated_at"]) <= _utc(last["updated_at"])
+        ):
+            continue
+        last = delivery
+        idle_deadline = loop.time() + STREAM_IDLE_TIMEOUT_SECONDS
+        yield delivery
+        if delivery["status"] == "DELIVERED":
+            return
@@ -0,0 +1,20 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from history import dwell_time_summary, record_transitions
+
+def test_percentiles_stay_within_observed_dwell_times(service):
+    async def scenario():
+        now = datetime.now(timezone.utc)
+        transitions = [
+            ({"order_id": order_id, "status": "PLACED", "updated_at": now - timedelta(seconds=0.2)}, "PACKED")
+            for order_id in range(20)
+        ]
+        await record_transitions(service.db, transitions, now)
+        return await dwell_time_summary(
+            service.db, now - timedelta(hours=1), now + timedelta(hours=1), service.STATUS_FLOW,
+        )
+
+    [placed] = asyncio.run(scenario())
+    assert placed["transitions"] == 20
+    assert placed["p50_seconds"] <= 0.2
+    assert placed["p95_seconds"] <= 0.2
@@ -0,0 +1,29 @@
+import asyncio
+from datetime import datetime, timezone
+import httpx
+
+async def _get_status(service, order_id):
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=service.app), base_url="http://delivery_service",
+    ) as client:
+        return await client.get(f"/order/{order_id}/status")
+
+def test_status_read_of_undrained_order_is_pending_and_writes_nothing(service):
+    async def scenario():
+        await service.outbox_worker.outbox.insert_one({
+            "type": "order_placed", "order_id": 5, "user_id": 1, "total": 10.0,
+            "created_at": datetime.now(timezone.utc),
+        })
+        pending = await _get_status(service, 5)
+        records = await service.db.delivery_statuses.count_documents({})
+        await service.outbox_worker.drain_once()
+        return pending, records, await _get_status(service, 5)
+
+    pending, records, drained = asyncio.run(scenario())
+    assert pending.status_code == 202
+    assert records == 0
+    assert drained.status_code == 200
+    assert drained.json()["status"] == "PLACED"
+
+def test_status_read_of_unknown_order_is_not_found(service):
+    assert asyncio.run(_get_status(service, 404)).status_code == 404
@@ -0,0 +1,48 @@
+import asyncio
+from datetime import datetime, timezone
+import pytest
+from fastapi import HTTPException
+
+def test_concurrent_advances_from_same_status(service, monkeypatch):
+    async def scenario():
+        await service.db.delivery_statuses.insert_one({
+            "id": 1, "order_id": 7, "status": "PLACED",
+            "updated_at": datetime.now(timezone.utc),
+        })
+        snapshot = await service.db.delivery_statuses.find_one({"order_id": 7})
+
+        async def stale_read(order_id):
+            # Both requests read PLACED before either writes.
+            await asyncio.sleep(0)
+            return dict(snapshot)
+
+        monkeypatch.setattr(service, "_find_delivery_to_update", stale_read)
+        outcomes = await asyncio.gather(
+            service.update_order_status(7),
+            service.update_order_status(7),
+            return_exceptions=True,
+        )
+        stored = await service.db.delivery_statuses.find_one({"order_id": 7})
+        transitions = await service.db.status_events.count_documents({})
+        return outcomes, stored, transitions
+
+    outcomes, stored, transitions = asyncio.run(scenario())
+
+    advanced = [outcome for outcome in outcomes if not isinstance(outcome, Exception)]
+    rejected = [outcome for outcome in outcomes if isinstance(outcome, HTTPException)]
+    assert len(advanced) == 1 and advanced[0].status == "PACKED"
+    assert len(rejected) == 1 and rejected[0].status_code == 409
+    assert stored["status"] == "PACKED"
+    assert transitions == 1
+
+def test_advance_rejects_moving_back(service):
+    async def scenario():
+        await service.db.delivery_statuses.insert_one({
+            "id": 1, "order_id": 8, "status": "PACKED",
+            "updated_at": datetime.now(timezone.utc),
+        })
+        await service.update_order_status(8, service.StatusUpdateRequest(status="PLACED"))
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(scenario())
+    assert exc.value.status_code == 400
@@ -0,0 +1,421 @@
+"""Bulk loader for the product catalog and for synthetic users, carts and orders.
+
+    python bulk_load.py --jsonl supplier.jsonl
+    python bulk_load.py --csv supplier.csv --batch-size 2000
+    python bulk_load.py --products 1000000 --users 200000 --carts 50000 --orders 500000
+
+File rows are validated against ``ProductResponse``; rows without an ``id``
+get one from a range reserved on ``counters`` up front, the same way the
+services reserve id blocks, so nothing a running service hands out can
+collide with them. Synthetic products are variations of ``SEED_PRODUCTS``.
+
+Every write is an unordered ``bulk_write`` of upserts keyed on the
+collection's unique key. Progress is saved to ``--checkpoint`` after each
+acknowledged batch; rerunning the same command after a failure continues
+from there with the same id ranges, and the batches that were in flight
+are simply written again. The checkpoint is removed once every step is done.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from pathlib import Path
+from pydantic import ValidationError
+from pymongo import ReplaceOne, ReturnDocument
+from cache import bump_catalog_version
+from database import client, db
+from models import ProductResponse
+from seed import SEED_PRODUCTS
+
+USERS_DB_NAME = os.getenv("USERS_DB_NAME", "thriftapp_users")
+ORDERS_DB_NAME = os.getenv("ORDERS_DB_NAME", "thriftapp_cart_orders")
+DELIVERY_DB_NAME = os.getenv("DELIVERY_DB_NAME", "thriftapp_delivery")
+# Must match cart_order_service's CART_STORAGE.
+CART_STORAGE = os.getenv("CART_STORAGE", "lines")
+
+PROGRESS_INTERVAL_SECONDS = 5
+MAX_REPORTED_ERRORS = 10
+# Products and users that synthetic carts and orders are drawn from.
+SAMPLE_SIZE = 10000
+SYNTHETIC_PASSWORD = "loadtest123"
+VARIANTS = ("Organic", "Premium", "Value", "Farm Fresh", "Classic", "Family Pack", "Local", "Select")
+STATUS_FLOW = ["PLACED", "PACKED", "OUT_FOR_DELIVERY", "DELIVERED"]
+
+class Checkpoint:
+    """Per-step progress of one loader run, rewritten after every batch."""
+
+    def __init__(self, path: Path, run: dict):
+        self.path = path
+        self.state = {"run": run, "steps": {}}
+        if path.exists():
+            saved = json.loads(path.read_text())
+            if saved.get("run") != run:
+                raise SystemExit(f"{path} belongs to a different run; delete it to start over")
+            self.state = saved
+            print(f"Resuming from {path}")
+
+    def step(self, name: str) -> dict | None:
+        return self.state["steps"].get(name)
+
+    def save(self, name: str, **fields):
+        self.state["steps"].setdefault(name, {}).update(fields)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(self.state))
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+class Progress:
+    def __init__(self, name: str, total: int, done: int):
+        self.name = name
+        self.total = total
+        self.first = done
+        self.started = self.last_report = time.perf_counter()
+
+    def report(self, done: int, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self.last_report < PROGRESS_INTERVAL_SECONDS:
+            return
+        self.last_report = now
+        rate = (done - self.first) / max(now - self.started, 1e-9)
+        print(
+            f"{self.name:<10}{done:>12,}/{self.total:<12,}"
+            f"{done / self.total if self.total else 1:>7.1%}{rate:>12,.0f} rows/s",
+            flush=True,
+        )
+
+async def reserve_ids(database, collection: str, count: int) -> int:
+    """Reserves ``count`` ids on ``database.counters`` with one ``$inc`` and
+    returns the first."""
+    counter = await database.counters.find_one_and_update(
+        {"_id": collection},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return counter["seq"] - count + 1
+
+async def run_step(checkpoint: Checkpoint, name: str, total: int, reservations: dict, make_batches, parallel: int):
+    """Writes one step's batches, at most ``parallel`` at a time.
+
+    ``reservations`` maps a label to ``(database, counter, count)``; the
+    reserved first ids are stored in the checkpoint and passed, together with
+    the number of rows already written, to ``make_batches``. That yields
+    ``(rows_done_after_batch, [(collection, ops), ...])`` in row order.
+    """
+    state = checkpoint.step(name)
+    if state is None:
+        bases = {
+            label: await reserve_ids(database, counter, count) if count else 0
+            for label, (database, counter, count) in reservations.items()
+        }
+        checkpoint.save(name, bases=bases, done=0, total=total)
+        state = checkpoint.step(name)
+    if state["done"] >= total:
+        print(f"{name}: already loaded")
+        return
+
+    progress = Progress(name, total, state["done"])
+    pending = deque()
+
+    async def settle():
+        done, writes = pending.popleft()
+        await writes
+        checkpoint.save(name, done=done)
+        progress.report(done)
+
+    for done, writes in make_batches(state["bases"], state["done"]):
+        pending.append((done, asyncio.gather(*(
+            collection.bulk_write(ops, ordered=False) for collection, ops in writes if ops
+        ))))
+        if len(pending) >= parallel:
+            await settle()
+    while pending:
+        await settle()
+    progress.report(total, force=True)
+
+def read_rows(path: Path):
+    with open(path, newline="", encoding="utf-8") as source:
+        if path.suffix.lower() == ".csv":
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+def product_from_row(row: dict, default_id: int) -> dict:
+    # Empty CSV cells mean "not given", so defaults apply to them as well.
+    product = {key: value for key, value in row.items() if value not in ("", None)}
+    product.setdefault("id", default_id)
+    product.setdefault("description", None)
+    product.setdefault("image_url", None)
+    product.setdefault("is_available", True)
+    return ProductResponse.model_validate(product).model_dump()
+
+def file_product_batches(path: Path, total: int, batch_size: int):
+    def batches(bases, done):
+        ops = []
+        skipped = 0
+        for index, row in enumerate(islice(read_rows(path), done, None), start=done):
+            try:
+                product = product_from_row(row, bases["products"] + index)
+            except ValidationError as exc:
+                skipped += 1
+                if skipped <= MAX_REPORTED_ERRORS:
+                    print(f"Skipping row {index + 1}: {exc.errors()[0]['loc']} {exc.errors()[0]['msg']}")
+            else:
+                ops.append(ReplaceOne({"id": product["id"]}, product, upsert=True))
+            if len(ops) >= batch_size:
+                yield index + 1, [(db.products, ops)]
+                ops = []
+        if skipped:
+            print(f"Skipped {skipped} invalid rows")
+        yield total, [(db.products, ops)]
+    return batches
+
+def synthetic_batches(total: int, batch_size: int, make_writes):
+    """Calls ``make_writes(bases, start, end)`` for each batch of row indexes."""
+    def batches(bases, done):
+        for start in range(done, total, batch_size):
+            end = min(start + batch_size, total)
+            yield end, make_writes(bases, start, end)
+    return batches
+
+def _rng(seed: int, kind: str, index: int) -> random.Random:
+    # One generator per row, so a resumed run regenerates identical rows.
+    return random.Random(f"{seed}:{kind}:{index}")
+
+def _created_at(rng: random.Random, days: int, now: datetime) -> datetime:
+    return now - timedelta(seconds=rng.uniform(0, days * 86400))
+
+def synthetic_products(seed: int):
+    def make_writes(bases, start, end):
+        ops = []
+        for index in range(start, end):
+            rng = _rng(seed, "products", index)
+            template = rng.choice(SEED_PRODUCTS)
+            product = {
+                **template,
+                "id": bases["products"] + index,
+                "name": f"{rng.choice(VARIANTS)} {template['name']}",
+                "price": round(template["price"] * rng.uniform(0.6, 1.8), 2),
+                "is_available": rng.random() > 0.05,
+            }
+            ops.append(ReplaceOne({"id": product["id"]}, product, upsert=True))
+        return [(db.products, ops)]
+    return make_writes
+
+def synthetic_users(seed: int, days: int, now: datetime):
+    from passlib.context import CryptContext
+
+    hashed_password = CryptContext(schemes=["bcrypt"]).hash(SYNTHETIC_PASSWORD)
+    users = client[USERS_DB_NAME].users
+
+    def make_writes(bases, start, end):
+        ops = []
+        for index in range(start, end):
+            rng = _rng(seed, "users", index)
+            user_id = bases["users"] + index
+            user = {
+                "id": user_id,
+                "name": f"Load Test User {user_id}",
+                "email": f"user{user_id}@loadtest.invalid",
+                "hashed_password": hashed_password,
+                "created_at": _created_at(rng, days, now),
+            }
+            ops.append(ReplaceOne({"id": user_id}, user, upsert=True))
+        return [(users, ops)]
+    return make_writes
+
+def synthetic_carts(seed: int, items_per_cart: int, products: list, user_ids: list):
+    orders_db = client[ORDERS_DB_NAME]
+
+    def make_writes(bases, start, end):
+        ops = []
+        for index in range(start, end):
+            rng = _rng(seed, "carts", index)
+            user_id = rng.choice(user_ids)
+            items = [
+                {
+                    "id": bases["cart_items"] + index * items_per_cart + offset,
+                    "product_id": product["id"],
+                    "product_name": product["name"],
+                    "product_price": product["price"],
+                    "quantity": rng.randint(1, 3),
+                }
+                for offset, product in enumerate(rng.sample(products, min(items_per_cart, len(products))))
+            ]
+            if CART_STORAGE == "document":
+                # Lines in a cart document are identified by their product id.
+                items = [{**item, "id": item["product_id"]} for item in items]
+                ops.append(ReplaceOne(
+                    {"user_id": user_id}, {"user_id": user_id, "items": items}, upsert=True,
+                ))
+            else:
+                ops.extend(
+                    ReplaceOne(
+                        {"user_id": user_id, "product_id": item["product_id"]},
+                        {**item, "user_id": user_id},
+                        upsert=True,
+                    )
+                    for item in items
+                )
+        collection = orders_db.carts if CART_STORAGE == "document" else orders_db.cart_items
+        return [(collection, ops)]
+    return make_writes
+
+def synthetic_orders(seed: int, days: int, now: datetime, products: list, user_ids: list):
+    orders = client[ORDERS_DB_NAME].orders
+    delivery_statuses = client[DELIVERY_DB_NAME].delivery_statuses
+
+    def make_writes(bases, start, end):
+        order_ops = []
+        delivery_ops = []
+        for index in range(start, end):
+            rng = _rng(seed, "orders", index)
+            order_id = bases["orders"] + index
+            items = [
+                {
+                    "product_id": product["id"],
+                    "product_name": product["name"],
+                    "quantity": rng.randint(1, 3),
+                    "price": product["price"],
+                }
+                for product in rng.sample(products, min(rng.randint(1, 5), len(products)))
+            ]
+            created_at = _created_at(rng, days, now)
+            order = {
+                "id": order_id,
+                "user_id": rng.choice(user_ids),
+                "order_ref": f"ORD-{rng.getrandbits(32):08X}",
+                "total": sum(item["price"] * item["quantity"] for item in items),
+                "created_at": created_at,
+                "items": items,
+            }
+            # One status step per hour since the order was placed.
+            hours = int((now - created_at).total_seconds() // 3600)
+            step = min(hours, len(STATUS_FLOW) - 1)
+            delivery = {
+                "id": bases["delivery_statuses"] + index,
+                "order_id": order_id,
+                "status": STATUS_FLOW[step],
+                "updated_at": created_at + timedelta(hours=step),
+            }
+            order_ops.append(ReplaceOne({"id": order_id}, order, upsert=True))
+            delivery_ops.append(ReplaceOne({"order_id": order_id}, delivery, upsert=True))
+        return [(orders, order_ops), (delivery_statuses, delivery_ops)]
+    return make_writes
+
+async def _sample(collection, query: dict, fields: dict) -> list:
+    return await collection.aggregate([
+        {"$match": query},
+        {"$sample": {"size": SAMPLE_SIZE}},
+        {"$project": {"_id": 0, **fields}},
+    ]).to_list(length=None)
+
+async def bulk_load(args):
+    source = args.jsonl or args.csv
+    run = {
+        "source": str(Path(source).resolve()) if source else None,
+        "products": args.products,
+        "users": args.users,
+        "carts": args.carts,
+        "cart_items": args.cart_items,
+        "orders": args.orders,
+        "days": args.days,
+        "seed": args.seed,
+    }
+    checkpoint = Checkpoint(Path(args.checkpoint), run)
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+
+    if source:
+        path = Path(source)
+        total = sum(1 for _ in read_rows(path))
+        await run_step(
+            checkpoint, "products", total, {"products": (db, "products", total)},
+            file_product_batches(path, total, args.batch_size), args.parallel,
+        )
+        # Ids given in the file may lie beyond the reserved range.
+        highest = await db.products.find_one({}, {"_id": 0, "id": 1}, sort=[("id", -1)])
+        if highest:
+            await db.counters.update_one(
+                {"_id": "products"}, {"$max": {"seq": highest["id"]}}, upsert=True,
+            )
+        await bump_catalog_version(db)
+    elif args.products:
+        await run_step(
+            checkpoint, "products", args.products, {"products": (db, "products", args.products)},
+            synthetic_batches(args.products, args.batch_size, synthetic_products(args.seed)),
+            args.parallel,
+        )
+        await bump_catalog_version(db)
+
+    if args.users:
+        users_db = client[USERS_DB_NAME]
+        await run_step(
+            checkpoint, "users", args.users, {"users": (users_db, "users", args.users)},
+            synthetic_batches(args.users, args.batch_size, synthetic_users(args.seed, args.days, now)),
+            args.parallel,
+        )
+
+    if args.carts or args.orders:
+        products = await _sample(db.products, {"is_available": True}, {"id": 1, "name": 1, "price": 1})
+        user_ids = [user["id"] for user in await _sample(client[USERS_DB_NAME].users, {}, {"id": 1})]
+        if not products or not user_ids:
+            raise SystemExit("Carts and orders need products and users; load those first")
+        orders_db = client[ORDERS_DB_NAME]
+
+        if args.carts:
+            count = 0 if CART_STORAGE == "document" else args.carts * args.cart_items
+            await run_step(
+                checkpoint, "carts", args.carts, {"cart_items": (orders_db, "cart_items", count)},
+                synthetic_batches(
+                    args.carts, args.batch_size,
+                    synthetic_carts(args.seed, args.cart_items, products, user_ids),
+                ),
+                args.parallel,
+            )
+        if args.orders:
+            await run_step(
+                checkpoint, "orders", args.orders,
+                {
+                    "orders": (orders_db, "orders", args.orders),
+                    "delivery_statuses": (client[DELIVERY_DB_NAME], "delivery_statuses", args.orders),
+                },
+                synthetic_batches(
+                    args.orders, args.batch_size,
+                    synthetic_orders(args.seed, args.days, now, products, user_ids),
+                ),
+                args.parallel,
+            )
+
+    checkpoint.remove()
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+    if args.users:
+        print(f"Synthetic users log in with password {SYNTHETIC_PASSWORD!r}")
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load the catalog and synthetic users, carts and orders")
+    sources = parser.add_mutually_exclusive_group()
+    sources.add_argument("--jsonl", help="Products to import, one JSON object per line")
+    sources.add_argument("--csv", help="Products to import, with a header row")
+    sources.add_argument("--products", type=int, default=0, help="Synthetic products to generate")
+    parser.add_argument("--users", type=int, default=0, help="Synthetic users to generate")
+    parser.add_argument("--carts", type=int, default=0, help="Synthetic carts, drawn from existing users")
+    parser.add_argument("--cart-items", type=int, default=3, help="Items per synthetic cart")
+    parser.add_argument("--orders", type=int, default=0, help="Synthetic orders, with delivery records")
+    parser.add_argument("--days", type=int, default=365, help="Spread synthetic timestamps over this many days")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--parallel", type=int, default=4, help="Batches in flight at once")
+    parser.add_argument("--checkpoint", default="bulk_load.checkpoint.json")
+    asyncio.run(bulk_load(parser.parse_args()))
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_PRODUCTS = int(os.getenv("CACHE_MAX_PRODUCTS", "5000"))
+CACHE_MAX_LISTINGS = int(os.getenv("CACHE_MAX_LISTINGS", "256"))
+CACHE_POLL_INTERVAL_SECONDS = float(os.getenv("CACHE_POLL_INTERVAL_SECONDS", "30"))
+# ``counters`` document that catalog writers bump with bump_catalog_version().
+CATALOG_VERSION_ID = "catalog_version"
+
+_MISSING = object()
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generation = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            value = await loader()
+            # Skip the fill if the cache was invalidated while we were loading.
+            if value is not None and generation == self._generation:
+                self.set(key, value)
+        return value
+
+    async def get_many_or_load(self, keys, loader) -> dict:
+        """Like ``get_or_load`` for many keys: ``loader(missing_keys)`` is
+        awaited once and returns a dict of whatever it found."""
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            generation = self._generation
+            loaded = await loader(missing)
+            if generation == self._generation:
+                for key, value in loaded.items():
+                    self.set(key, value)
+            found.update(loaded)
+        return found
+
+    def clear(self):
+        self._data.clear()
+        self._generation += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+product_cache = TTLCache("products", CACHE_MAX_PRODUCTS, CACHE_TTL_SECONDS)
+listing_cache = TTLCache("listings", CACHE_MAX_LISTINGS, CACHE_TTL_SECONDS)
+category_cache = TTLCache("categories", 1, CACHE_TTL_SECONDS)
+
+ALL_CACHES = (product_cache, listing_cache, category_cache)
+
+invalidation_state = {"mode": "starting", "invalidations": 0}
+
+# Objects with invalidate() and apply_change(change) that keep their own
+# view of the catalog in sync with the watcher (e.g. the search index).
+catalog_listeners = []
+
+def invalidate_caches():
+    for cache in ALL_CACHES:
+        cache.clear()
+    invalidation_state["invalidations"] += 1
+
+def invalidate_all():
+    invalidate_caches()
+    for listener in catalog_listeners:
+        listener.invalidate()
+
+def cache_stats() -> dict:
+    return {
+        "caches": [cache.stats() for cache in ALL_CACHES],
+        "invalidation": dict(invalidation_state),
+    }
+
+async def _watch_change_stream(collection):
+    async with collection.watch(full_document="updateLookup") as stream:
+        invalidation_state["mode"] = "change_stream"
+        # Anything written before the stream opened may already be cached.
+        invalidate_all()
+        async for change in stream:
+            invalidate_caches()
+            for listener in catalog_listeners:
+                listener.apply_change(change)
+
+async def bump_catalog_version(database):
+    """Marks the catalog as changed; call after writing to ``products``."""
+    await database.counters.update_one(
+        {"_id": CATALOG_VERSION_ID}, {"$inc": {"seq": 1}}, upsert=True,
+    )
+
+async def _catalog_stamp(collection) -> str:
+    """The version writers bump, the newest ``_id`` and the document count
+    so inserts and deletes made by other tools still change it, and the
+    newest ``updated_at`` for products edited in place. Four indexed or
+    metadata reads; nothing scans or locks the collection."""
+    version, newest, count, edited = await asyncio.gather(
+        collection.database.counters.find_one({"_id": CATALOG_VERSION_ID}),
+        collection.find_one({}, {"_id": 1}, sort=[("_id", -1)]),
+        collection.estimated_document_count(),
+        collection.find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)]),
+    )
+    return "-".join((
+        str(version["seq"] if version else 0),
+        str(newest["_id"] if newest else ""),
+        str(count),
+        str(edited.get("updated_at", "") if edited else ""),
+    ))
+
+async def _poll_for_changes(collection):
+    invalidation_state["mode"] = "polling"
+    last = await _catalog_stamp(collection)
+    while True:
+        await asyncio.sleep(CACHE_POLL_INTERVAL_SECONDS)
+        current = await _catalog_stamp(collection)
+        if current != last:
+            last = current
+            invalidate_all()
+
+class CatalogVersion:
+    """Stamp that changes whenever the catalog does; used for ETags.
+
+    It is read from the database (``_catalog_stamp``), so every replica of
+    the service agrees on it. Re-read on the first request after a change.
+    With a change stream it also carries the cluster time of the last
+    change seen, which catches in-place edits that leave the stored stamp
+    alone. If the read fails it falls back to a per-process stamp, which
+    is still correct but not shared between replicas.
+    """
+
+    def __init__(self):
+        self.value = None
+        self.last_change = ""
+        self._dirty = True
+        self._process_stamp = uuid.uuid4().hex[:8]
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._dirty = True
+
+    def apply_change(self, change):
+        cluster_time = change.get("clusterTime")
+        if cluster_time is not None:
+            self.last_change = f"{cluster_time.time}.{cluster_time.inc}"
+        self._dirty = True
+
+    async def get(self, collection) -> str:
+        if self._dirty:
+            async with self._lock:
+                if self._dirty:
+                    self._dirty = False
+                    try:
+                        stamp = await _catalog_stamp(collection)
+                    except PyMongoError as exc:
+                        logger.warning("Could not read catalog version: %s", exc)
+                        stamp = None
+                    self.value = f"{stamp}-{self.last_change}" if stamp else (
+                        f"{self._process_stamp}-{invalidation_state['invalidations']}"
+                    )
+        return self.value
+
+catalog_version = CatalogVersion()
+
+async def watch_catalog(collection):
+    while True:
+        try:
+            await _watch_change_stream(collection)
+        except OperationFailure as exc:
+            # Standalone mongod has no oplog, so change streams are unavailable.
+            logger.info("Change streams unavailable (%s); polling for catalog changes", exc)
+            break
+        except PyMongoError as exc:
+            logger.warning("Catalog change stream interrupted: %s", exc)
+            invalidate_all()
+            await asyncio.sleep(1)
+
+    while True:
+        try:
+            await _poll_for_changes(collection)
+        except PyMongoError as exc:
+            logger.warning("Catalog polling failed: %s", exc)
+            invalidate_all()
+            await asyncio.sleep(CACHE_POLL_INTERVAL_SECONDS)
@@ -1,11 +1,58 @@
-from fastapi import FastAPI, HTTPException, status, Query
+import asyncio
+import hashlib
+import os
+import orjson
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response, status, Query
 from fastapi.middleware.cors import CORSMiddleware
-from database import db
-from models import ProductResponse, CategoryResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from database import client, db, ensure_indexes, index_stats
+from pool import pool_metrics, warm_pool
+from metrics import MetricsMiddleware, metrics_response
+from admission import AdmissionController, AdmissionMiddleware
+from cache import (
+    product_cache, listing_cache, category_cache, cache_stats, catalog_listeners,
+    catalog_version, watch_catalog,
+)
+from search import search_index
+from models import (
+    ProductResponse, ProductPage, ProductSearchPage, CategoryResponse,
+    ProductBatchRequest, ProductBatchResponse, projection,
+)
 from typing import Optional
 
-app = FastAPI(title="Product Catalog Service", version="1.0.0")
+MAX_PAGE_SIZE = 500
+MAX_SEARCH_PAGE_SIZE = 100
+
+CATALOG_MAX_AGE_SECONDS = int(os.getenv("CATALOG_MAX_AGE_SECONDS", "60"))
+CATALOG_STALE_WHILE_REVALIDATE_SECONDS = int(os.getenv("CATALOG_STALE_WHILE_REVALIDATE_SECONDS", "300"))
+CATALOG_CACHE_CONTROL = (
+    f"public, max-age={CATALOG_MAX_AGE_SECONDS}, "
+    f"stale-while-revalidate={CATALOG_STALE_WHILE_REVALIDATE_SECONDS}"
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_pool(client)
+    await ensure_indexes()
+    catalog_listeners.extend([search_index, catalog_version])
+    await search_index.ensure_fresh(db.products)
+    watcher = asyncio.create_task(watch_catalog(db.products))
+    yield
+    watcher.cancel()
+    client.close()
+
+admission = AdmissionController({})
+
+app = FastAPI(
+    title="Product Catalog Service",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
+app.add_middleware(AdmissionMiddleware, controller=admission)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -22,17 +69,168 @@ def root():
 def health():
     return {"status": "healthy", "service": "product_service"}
 
-@app.get("/products", response_model=list[ProductResponse])
-async def get_products(category: Optional[str] = Query(None)):
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
+
+@app.get("/admin/admission-stats")
+def get_admission_stats():
+    return admission.stats()
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return cache_stats()
+
+@app.get("/admin/index-stats")
+async def get_index_stats():
+    return await index_stats()
+
+@app.get("/admin/pool-stats")
+def get_pool_stats():
+    return pool_metrics.stats()
+
+async def _not_modified(request: Request, response: Response) -> Response | None:
+    """Sets ETag and Cache-Control on ``response``, or returns a 304 when the
+    client's ``If-None-Match`` already has this version of the URL."""
+    version = await catalog_version.get(db.products)
+    url = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    etag = '"' + hashlib.sha256(f"{version}|{url}".encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in candidates or etag in candidates:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+async def _stream_products(products):
+    async for product in products:
+        yield orjson.dumps(product) + b"\n"
+
+@app.get("/products", response_model=list[ProductResponse] | ProductPage)
+async def get_products(
+    request: Request,
+    response: Response,
+    category: Optional[str] = Query(None),
+    cursor: Optional[int] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = Query(False),
+):
+    not_modified = await _not_modified(request, response)
+    if not_modified:
+        return not_modified
     query = {}
     if category:
         query["category"] = category
-    products = await db.products.find(query, {"_id": 0}).to_list(length=200)
-    return products
+    if cursor is not None:
+        query["id"] = {"$gt": cursor}
+    products = db.products.find(query, projection(ProductResponse)).sort("id", 1)
+
+    if stream:
+        if limit is not None:
+            products = products.limit(limit)
+        return StreamingResponse(
+            _stream_products(products),
+            media_type="application/x-ndjson",
+            headers=dict(response.headers),
+        )
+
+    async def load_listing():
+        if limit is None and cursor is None:
+            # Plain-list response for existing clients, capped like a page;
+            # larger catalogs are read with limit/cursor.
+            return await products.limit(MAX_PAGE_SIZE).to_list(length=None)
+
+        page_size = limit or MAX_PAGE_SIZE
+        items = await products.limit(page_size + 1).to_list(length=None)
+        next_cursor = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            next_cursor = items[-1]["id"]
+        return {"items": items, "next_cursor": next_cursor}
+
+    listing = await listing_cache.get_or_load((category, cursor, limit), load_listing)
+    return ORJSONResponse(listing, headers=dict(response.headers))
+
+@app.get("/products/search", response_model=ProductSearchPage)
+async def search_products(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
+    not_modified = await _not_modified(request, response)
+    if not_modified:
+        return not_modified
+    await search_index.ensure_fresh(db.products)
+    matches = search_index.search(q)
+    end = offset + limit
+    return ORJSONResponse(
+        {
+            "items": matches[offset:end],
+            "total": len(matches),
+            "next_offset": end if end < len(matches) else None,
+        },
+        headers=dict(response.headers),
+    )
+
+async def _get_products_by_id(ids: list[int]) -> dict:
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_PAGE_SIZE} ids per request",
+        )
+
+    async def load(missing):
+        products = await db.products.find(
+            {"id": {"$in": missing}}, projection(ProductResponse)
+        ).to_list(length=None)
+        return {product["id"]: product for product in products}
+
+    found = await product_cache.get_many_or_load(ids, load)
+    return {
+        "items": [found[product_id] for product_id in ids if product_id in found],
+        "missing": [product_id for product_id in ids if product_id not in found],
+    }
+
+@app.get("/products/batch", response_model=ProductBatchResponse)
+async def get_products_batch(
+    request: Request,
+    response: Response,
+    ids: str = Query(..., description="Comma-separated product ids"),
+):
+    not_modified = await _not_modified(request, response)
+    if not_modified:
+        return not_modified
+    try:
+        product_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids must be a comma-separated list of integers",
+        )
+    return ORJSONResponse(await _get_products_by_id(product_ids), headers=dict(response.headers))
+
+@app.post("/products/batch", response_model=ProductBatchResponse)
+async def post_products_batch(request: ProductBatchRequest):
+    return ORJSONResponse(await _get_products_by_id(request.ids))
+
+@app.get("/search/stats")
+def get_search_stats():
+    return search_index.stats()
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
+async def get_product(product_id: int, request: Request, response: Response):
+    not_modified = await _not_modified(request, response)
+    if not_modified:
+        return not_modified
+    product = await product_cache.get_or_load(
+        product_id,
+        lambda: db.products.find_one({"id": product_id}, projection(ProductResponse)),
+    )
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -41,10 +239,14 @@ async def get_product(product_id: int):
     return product
 
 @app.get("/categories", response_model=list[CategoryResponse])
-async def get_categories():
+async def get_categories(request: Request, response: Response):
+    not_modified = await _not_modified(request, response)
+    if not_modified:
+        return not_modified
     pipeline = [
         {"$group": {"_id": "$category", "product_count": {"$sum": 1}}},
         {"$project": {"name": "$_id", "product_count": 1, "_id": 0}},
     ]
-    results = await db.products.aggregate(pipeline).to_list(length=100)
-    return results
+    return await category_cache.get_or_load(
+        "all", lambda: db.products.aggregate(pipeline).to_list(length=100)
+    )
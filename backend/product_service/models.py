@@ -12,3 +12,24 @@ class ProductResponse(BaseModel):
 class CategoryResponse(BaseModel):
     name: str
     product_count: int
+
+class ProductPage(BaseModel):
+    items: list[ProductResponse]
+    next_cursor: int | None
+
+class ProductBatchRequest(BaseModel):
+    ids: list[int]
+
+class ProductBatchResponse(BaseModel):
+    items: list[ProductResponse]
+    missing: list[int]
+
+class ProductSearchPage(BaseModel):
+    items: list[ProductResponse]
+    total: int
+    next_offset: int | None
+
+def projection(model: type[BaseModel]) -> dict:
+    """MongoDB projection returning exactly ``model``'s fields, so documents
+    written by this service can be sent as-is without re-validation."""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
@@ -0,0 +1,213 @@
+import asyncio
+import bisect
+import logging
+import re
+from collections import defaultdict
+from models import ProductResponse
+
+logger = logging.getLogger(__name__)
+
+# Per-field weight of a matching token.
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+# Relative score of how a query term matched an indexed token.
+EXACT, PREFIX, FUZZY = 1.0, 0.7, 0.4
+MIN_FUZZY_LENGTH = 4
+# Indexed documents are returned as search results without re-validation.
+PRODUCT_FIELDS = tuple(ProductResponse.model_fields)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str | None) -> list[str]:
+    return _TOKEN.findall(text.lower()) if text else []
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if ``a`` and ``b`` differ by at most one insertion, deletion,
+    substitution or adjacent transposition."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return (
+            a[i + 1:] == b[i + 1:]
+            or (i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:])
+        )
+    return a[i:] == b[i + 1:]
+
+def _post(postings: dict, product_id: int, product: dict) -> list[str]:
+    """Adds ``product``'s tokens to ``postings``; returns the tokens that
+    were not indexed before."""
+    new_tokens = []
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(product.get(field)):
+            token_postings = postings[token]
+            if not token_postings:
+                new_tokens.append(token)
+            token_postings[product_id] = max(token_postings.get(product_id, 0.0), weight)
+    return new_tokens
+
+def _index_products(products: list[dict]):
+    """Builds every table of a ``SearchIndex`` from scratch. Touches no
+    shared state, so it runs in a worker thread; the vocabulary is sorted
+    once at the end instead of kept sorted token by token."""
+    by_id = {}
+    ids_by_object_id = {}
+    postings = defaultdict(dict)
+    for product in products:
+        object_id = product.pop("_id")
+        ids_by_object_id[object_id] = product["id"]
+        by_id[product["id"]] = product
+        _post(postings, product["id"], product)
+    return by_id, ids_by_object_id, postings, sorted(postings)
+
+def _log_failed_rebuild(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Search index rebuild failed: %s", task.exception())
+
+class SearchIndex:
+    """In-memory inverted index over product name, category and description.
+
+    Query terms match indexed tokens exactly, as a prefix, or (for terms of
+    ``MIN_FUZZY_LENGTH`` or more) with one typo in the term or its prefix.
+    Every term must match; products are ranked by summed field weights.
+    """
+
+    def __init__(self):
+        self.builds = 0
+        self._products: dict[int, dict] = {}
+        self._ids_by_object_id: dict = {}
+        self._postings: dict[str, dict[int, float]] = defaultdict(dict)
+        self._vocabulary: list[str] = []
+        self._stale = True
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._rebuild = None
+
+    def _add(self, object_id, product: dict):
+        self._remove(object_id)
+        product_id = product["id"]
+        self._ids_by_object_id[object_id] = product_id
+        self._products[product_id] = product
+        for token in _post(self._postings, product_id, product):
+            bisect.insort(self._vocabulary, token)
+
+    def _remove(self, object_id):
+        product_id = self._ids_by_object_id.pop(object_id, None)
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        for field in FIELD_WEIGHTS:
+            for token in tokenize(product.get(field)):
+                postings = self._postings.get(token)
+                if postings is None or postings.pop(product_id, None) is None:
+                    continue
+                if not postings:
+                    del self._postings[token]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+
+    async def build(self, collection):
+        generation = self._generation
+        products = await collection.find(
+            {}, {"_id": 1, **{field: 1 for field in PRODUCT_FIELDS}}
+        ).to_list(length=None)
+        # Swapped in whole, so searches see the old index until this one is done.
+        self._products, self._ids_by_object_id, self._postings, self._vocabulary = (
+            await asyncio.to_thread(_index_products, products)
+        )
+        self.builds += 1
+        # A change that arrived while loading may be missing from the snapshot.
+        self._stale = generation != self._generation
+
+    async def _refresh(self, collection):
+        async with self._lock:
+            if self._stale:
+                await self.build(collection)
+
+    async def ensure_fresh(self, collection):
+        """Builds the index if there is none yet. A stale index keeps serving
+        while a single rebuild runs in the background."""
+        if not self._stale:
+            return
+        if not self.builds:
+            await self._refresh(collection)
+        elif self._rebuild is None or self._rebuild.done():
+            self._rebuild = asyncio.create_task(self._refresh(collection))
+            self._rebuild.add_done_callback(_log_failed_rebuild)
+
+    def invalidate(self):
+        self._generation += 1
+        self._stale = True
+
+    def apply_change(self, change: dict):
+        """Applies one ``products`` change stream event (with ``fullDocument``)."""
+        self._generation += 1
+        operation = change["operationType"]
+        if operation not in ("insert", "update", "replace", "delete"):
+            self._stale = True
+            return
+        object_id = change["documentKey"]["_id"]
+        document = change.get("fullDocument")
+        if operation == "delete" or document is None:
+            self._remove(object_id)
+        else:
+            self._add(object_id, {field: document.get(field) for field in PRODUCT_FIELDS})
+
+    def _matches(self, term: str) -> dict[str, float]:
+        """Indexed tokens matching ``term`` and how well each one matches."""
+        matches = {}
+        start = bisect.bisect_left(self._vocabulary, term)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            matches[token] = EXACT if token == term else PREFIX
+        if len(term) >= MIN_FUZZY_LENGTH:
+            first = bisect.bisect_left(self._vocabulary, term[0])
+            for token in self._vocabulary[first:]:
+                if token[0] != term[0]:
+                    break
+                if token not in matches and any(
+                    _within_one_edit(term, token[:length])
+                    for length in (len(term) - 1, len(term), len(term) + 1, len(token))
+                ):
+                    matches[token] = FUZZY
+        return matches
+
+    def search(self, query: str) -> list[dict]:
+        scores: dict[int, float] | None = None
+        for term in dict.fromkeys(tokenize(query)):
+            term_scores: dict[int, float] = {}
+            for token, quality in self._matches(term).items():
+                for product_id, weight in self._postings[token].items():
+                    score = quality * weight
+                    if score > term_scores.get(product_id, 0.0):
+                        term_scores[product_id] = score
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    product_id: score + term_scores[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in term_scores
+                }
+            if not scores:
+                return []
+        if not scores:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self._products[product_id] for product_id, _ in ranked]
+
+    def stats(self) -> dict:
+        return {
+            "products": len(self._products),
+            "tokens": len(self._vocabulary),
+            "builds": self.builds,
+            "stale": self._stale,
+            "rebuilding": self._rebuild is not None and not self._rebuild.done(),
+        }
+
+search_index = SearchIndex()
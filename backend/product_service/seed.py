@@ -4,6 +4,7 @@ import certifi
 from pathlib import Path
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
+from cache import bump_catalog_version
 
 load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
 
@@ -80,15 +81,16 @@ async def seed():
         await database.products.delete_many({})
         await database.counters.delete_one({"_id": "products"})
 
-    for i, product_data in enumerate(SEED_PRODUCTS, start=1):
-        product_data["id"] = i
-        await database.products.insert_one(product_data)
+    await database.products.insert_many(
+        [{**product, "id": i} for i, product in enumerate(SEED_PRODUCTS, start=1)]
+    )
 
     await database.counters.update_one(
         {"_id": "products"},
         {"$set": {"seq": len(SEED_PRODUCTS)}},
         upsert=True,
     )
+    await bump_catalog_version(database)
 
     print(f"Seeded {len(SEED_PRODUCTS)} products successfully!")
     client.close()
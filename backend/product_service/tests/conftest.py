@@ -0,0 +1,27 @@
+"""Runs the service against an in-memory mongomock client.
+
+Needs pytest and mongomock-motor (see backend/benchmarks/requirements.txt);
+run from this service's directory with ``python -m pytest tests``.
+"""
+import asyncio
+import importlib
+import os
+import sys
+from pathlib import Path
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://mongomock")
+
+pool = importlib.import_module("pool")
+pool.create_client = lambda url: AsyncMongoMockClient()
+main = importlib.import_module("main")
+
+@pytest.fixture
+def service():
+    yield main
+    asyncio.run(main.client.drop_database(main.db.name))
+    main.catalog_version.last_change = ""
+    main.catalog_version.invalidate()
+    importlib.import_module("cache").invalidate_caches()
@@ -0,0 +1,57 @@
+import asyncio
+from datetime import datetime, timezone
+import httpx
+from bson import Timestamp
+import cache
+
+PRODUCT = {
+    "id": 1, "name": "Tea", "description": None, "price": 10.0,
+    "category": "Snacks & Beverages", "image_url": None, "is_available": True,
+}
+
+async def _get(service, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=service.app), base_url="http://product_service",
+    ) as client:
+        return await client.get("/products/1", headers=headers)
+
+def test_in_place_edit_seen_by_polling_changes_etag(service, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_POLL_INTERVAL_SECONDS", 0.01)
+    # As registered by the lifespan, which these tests do not run.
+    monkeypatch.setattr(cache, "catalog_listeners", [service.catalog_version])
+
+    async def scenario():
+        await service.db.products.insert_one(dict(PRODUCT))
+        first = await _get(service)
+        poller = asyncio.create_task(cache._poll_for_changes(service.db.products))
+        await asyncio.sleep(0.05)
+        await service.db.products.update_one(
+            {"id": 1}, {"$set": {"price": 12.5, "updated_at": datetime.now(timezone.utc)}},
+        )
+        await asyncio.sleep(0.05)
+        poller.cancel()
+        return first, await _get(service, first.headers["ETag"])
+
+    first, second = asyncio.run(scenario())
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()["price"] == 12.5
+
+def test_in_place_edit_seen_by_change_stream_changes_etag(service):
+    async def scenario():
+        await service.db.products.insert_one(dict(PRODUCT))
+        first = await _get(service)
+        unchanged = await _get(service, first.headers["ETag"])
+        # No updated_at: only the change stream event reveals this edit.
+        await service.db.products.update_one({"id": 1}, {"$set": {"price": 12.5}})
+        cache.invalidate_caches()
+        service.catalog_version.apply_change({"clusterTime": Timestamp(1700000000, 1)})
+        return first, unchanged, await _get(service, first.headers["ETag"])
+
+    first, unchanged, second = asyncio.run(scenario())
+    assert unchanged.status_code == 304
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()["price"] == 12.5
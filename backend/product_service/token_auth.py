@@ -0,0 +1,113 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from dotenv import load_dotenv
+from jose import JWTError, jwt
+from fastapi import HTTPException, status, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+
+load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    raise RuntimeError("SECRET_KEY environment variable is not set")
+ALGORITHM = "HS256"
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+REJECTED_TOKEN_CACHE_SIZE = int(os.getenv("REJECTED_TOKEN_CACHE_SIZE", "1000"))
+REJECTED_TOKEN_TTL_SECONDS = float(os.getenv("REJECTED_TOKEN_TTL_SECONDS", "60"))
+
+security = HTTPBearer()
+
+class ExpiringLRU:
+    """Bounded LRU whose entries each carry their own absolute expiry time."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key, now: float):
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= now:
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, expires_at: float):
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+verified_tokens = ExpiringLRU(TOKEN_CACHE_SIZE)
+rejected_tokens = ExpiringLRU(REJECTED_TOKEN_CACHE_SIZE)
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
+def decode_token(token: str) -> tuple[int, float | None]:
+    """Fully verifies ``token`` and returns ``(user_id, exp)``."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _unauthorized("Invalid or expired token")
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise _unauthorized("Invalid token")
+    exp = payload.get("exp")
+    return user_id, float(exp) if exp is not None else None
+
+def authenticate(token: str) -> int:
+    """Returns the token's ``user_id``, decoding the JWT only on a cache miss.
+
+    Verified tokens are cached until their ``exp``; rejected ones for
+    ``REJECTED_TOKEN_TTL_SECONDS`` so a client replaying a bad token does not
+    pay for a signature check on every request.
+    """
+    now = time.time()
+    digest = hashlib.sha256(token.encode()).digest()
+
+    user_id = verified_tokens.get(digest, now)
+    if user_id is not None:
+        return user_id
+
+    detail = rejected_tokens.get(digest, now)
+    if detail is not None:
+        raise _unauthorized(detail)
+
+    try:
+        user_id, exp = decode_token(token)
+    except HTTPException as exc:
+        rejected_tokens.set(digest, exc.detail, now + REJECTED_TOKEN_TTL_SECONDS)
+        raise
+    if exp is not None:
+        verified_tokens.set(digest, user_id, exp)
+    return user_id
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
+    return authenticate(credentials.credentials)
+
+def token_cache_stats() -> dict:
+    return {
+        "verified": verified_tokens.stats(),
+        "rejected": rejected_tokens.stats(),
+    }
@@ -1,11 +1,13 @@
+import asyncio
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
-from jose import JWTError, jwt
+from jose import jwt
 from passlib.context import CryptContext
-from fastapi import HTTPException, status, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import HTTPException, status
+from token_auth import verify_token  # noqa: F401
 
 load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
 
@@ -17,34 +19,93 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 
 HARDCODED_OTP = os.getenv("HARDCODED_OTP", "1234")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = HTTPBearer()
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "thread")
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", "2"))
+HASH_MAX_WAITING = int(os.getenv("HASH_MAX_WAITING", "64"))
 
-def hash_password(password: str) -> str:
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+def _hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded worker pool.
+
+    At most ``pool_size`` hashes run at once; up to ``max_waiting`` more queue
+    for a slot and anything beyond that is rejected with 503.
+    """
+
+    def __init__(self, kind: str, pool_size: int, max_waiting: int):
+        executor_cls = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+        self.kind = kind
+        self.pool_size = pool_size
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = executor_cls(max_workers=pool_size)
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def run(self, fn, *args):
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "pool_size": self.pool_size,
+            "max_waiting": self.max_waiting,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher(HASH_POOL_KIND, HASH_POOL_SIZE, HASH_MAX_WAITING)
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(_hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    valid, _ = await verify_and_update_password(plain_password, hashed_password)
+    return valid
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Returns ``(valid, new_hash)``; ``new_hash`` is set when the stored hash
+    uses outdated settings (e.g. a lower ``BCRYPT_ROUNDS``) and should be
+    replaced."""
+    return await password_hasher.run(_verify_and_update, plain_password, hashed_password)
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
-    token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token"
-            )
-        return user_id
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
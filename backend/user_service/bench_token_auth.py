@@ -0,0 +1,35 @@
+"""Micro-benchmark for verify_token: full JWT decode vs. the verified-token cache.
+
+    python bench_token_auth.py [iterations]
+"""
+import sys
+import time
+from auth import create_access_token
+from token_auth import authenticate, decode_token, rejected_tokens, verified_tokens
+
+def _time(label: str, fn, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {elapsed / iterations * 1e6:8.2f} us/call  ({iterations} calls)")
+
+def _rejected(token: str):
+    try:
+        authenticate(token)
+    except Exception:
+        pass
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    token = create_access_token({"user_id": 1, "email": "bench@example.com"})
+    bad_token = token[:-2] + ("AA" if not token.endswith("AA") else "BB")
+
+    verified_tokens.clear()
+    rejected_tokens.clear()
+    _time("uncached decode", lambda: decode_token(token), iterations)
+    _time("cached authenticate", lambda: authenticate(token), iterations)
+    _time("rejected (negative hit)", lambda: _rejected(bad_token), iterations)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,38 @@
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from database import db, get_next_id
+from fastapi.responses import ORJSONResponse
+from pymongo.errors import DuplicateKeyError
+from database import client, db, get_next_id, ensure_indexes, index_stats
+from pool import pool_metrics, warm_pool
+from metrics import MetricsMiddleware, metrics_response
+from admission import AdmissionController, AdmissionMiddleware
 from models import UserRegister, UserLogin, UserProfile, Token
-from auth import hash_password, verify_password, create_access_token
+from auth import hash_password, verify_and_update_password, create_access_token, password_hasher
+from token_auth import authenticate, token_cache_stats
 
-app = FastAPI(title="User Service", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_pool(client)
+    await ensure_indexes()
+    yield
+    password_hasher.shutdown()
+    client.close()
 
+admission = AdmissionController(
+    {"POST /login": 32, "POST /register": 32}, authenticate=authenticate,
+)
+
+app = FastAPI(
+    title="User Service",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+app.add_middleware(AdmissionMiddleware, controller=admission)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,6 +49,30 @@ def root():
 def health():
     return {"status": "healthy", "service": "user_service"}
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return metrics_response()
+
+@app.get("/admin/admission-stats")
+def get_admission_stats():
+    return admission.stats()
+
+@app.get("/auth/hash-stats")
+def get_hash_stats():
+    return password_hasher.stats()
+
+@app.get("/auth/token-stats")
+def get_token_stats():
+    return token_cache_stats()
+
+@app.get("/admin/index-stats")
+async def get_index_stats():
+    return await index_stats()
+
+@app.get("/admin/pool-stats")
+def get_pool_stats():
+    return pool_metrics.stats()
+
 @app.post("/register", response_model=Token)
 async def register(user_data: UserRegister):
     existing = await db.users.find_one({"email": user_data.email})
@@ -37,10 +87,17 @@ async def register(user_data: UserRegister):
         "id": user_id,
         "name": user_data.name,
         "email": user_data.email,
-        "hashed_password": hash_password(user_data.password),
+        "hashed_password": await hash_password(user_data.password),
         "created_at": datetime.now(timezone.utc),
     }
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # A concurrent registration took the email after the check above.
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email already registered",
+        )
 
     token = create_access_token({"user_id": user_id, "email": user_data.email})
     return Token(
@@ -53,11 +110,20 @@ async def register(user_data: UserRegister):
 @app.post("/login", response_model=Token)
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user["hashed_password"]):
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await verify_and_update_password(
+            credentials.password, user["hashed_password"]
+        )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
         )
+    if new_hash:
+        await db.users.update_one(
+            {"id": user["id"]}, {"$set": {"hashed_password": new_hash}}
+        )
 
     token = create_access_token({"user_id": user["id"], "email": user["email"]})
     return Token(
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+import certifi
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from metrics import MONGO_POOL_CHECKOUT_WAIT, mongo_command_metrics
+
+logger = logging.getLogger(__name__)
+
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+# Comma-separated, in order of preference: zstd and/or zlib. snappy would
+# also need python-snappy, which requirements.txt does not install.
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts connections and how long callers wait to check one out."""
+
+    def __init__(self):
+        self.open = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.pools_cleared = 0
+
+    def _record_wait(self, duration: float, outcome: str):
+        MONGO_POOL_CHECKOUT_WAIT.labels(outcome).observe(duration)
+        self.wait_seconds_total += duration
+        self.wait_seconds_max = max(self.wait_seconds_max, duration)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        self.checkouts += 1
+        self.checked_out += 1
+        self._record_wait(event.duration, "checked_out")
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+        self._record_wait(event.duration, "failed")
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self.pools_cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self) -> dict:
+        attempts = self.checkouts + self.checkout_failures
+        return {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "open_connections": self.open,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "checkout_wait_avg_ms": self.wait_seconds_total / attempts * 1000 if attempts else 0.0,
+            "checkout_wait_max_ms": self.wait_seconds_max * 1000,
+            "pools_cleared": self.pools_cleared,
+        }
+
+pool_metrics = PoolMetrics()
+
+def create_client(url: str) -> AsyncIOMotorClient:
+    """Builds the service's client with the pool settings above.
+
+    Motor does not connect (or bind to an event loop) until the first
+    operation, so this is safe to call at import time.
+    """
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+        "event_listeners": [pool_metrics, mongo_command_metrics],
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return AsyncIOMotorClient(url, tlsCAFile=certifi.where(), **options)
+
+async def warm_pool(client: AsyncIOMotorClient):
+    """Opens ``MONGO_MIN_POOL_SIZE`` connections before the service takes traffic.
+
+    Concurrent pings each need their own connection, so the pool is filled
+    now instead of by the first requests after a rollout.
+    """
+    try:
+        await asyncio.gather(
+            *(client.admin.command("ping") for _ in range(max(1, MONGO_MIN_POOL_SIZE)))
+        )
+    except PyMongoError as exc:
+        logger.warning("Could not warm MongoDB connection pool: %s", exc)
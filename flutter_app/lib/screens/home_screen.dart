@@ -144,11 +144,19 @@ class _HomeTabState extends State<_HomeTab> with TickerProviderStateMixin {
       _error = null;
     });
     try {
-      final cats = await ApiService.getCategories();
-      final prods = await ApiService.getProducts();
+      List<dynamic>? cats;
+      List<dynamic>? prods;
+      try {
+        final home = await ApiService.getHome();
+        cats = home['categories'];
+        prods = home['products'];
+      } catch (_) {}
+      // Fall back to the catalog service if the aggregated call failed.
+      cats ??= await ApiService.getCategories();
+      prods ??= await ApiService.getProducts();
       setState(() {
-        _categories = cats;
-        _products = prods;
+        _categories = cats!;
+        _products = prods!;
         _loading = false;
       });
     } catch (e) {
@@ -14,6 +14,7 @@ class ApiService {
   static String get productServiceUrl => 'http://$_baseHost:8002';
   static String get cartOrderServiceUrl => 'http://$_baseHost:8003';
   static String get deliveryServiceUrl => 'http://$_baseHost:8004';
+  static String get bffServiceUrl => 'http://$_baseHost:8005';
 
   static Future<String?> getToken() async {
     final prefs = await SharedPreferences.getInstance();
@@ -105,6 +106,19 @@ class ApiService {
     throw Exception('Failed to load product');
   }
 
+  static Future<Map<String, dynamic>> getHome() async {
+    final userId = await getUserId();
+    final token = await getToken();
+    final response = await http.get(
+      Uri.parse('$bffServiceUrl/home?user_id=$userId'),
+      headers: {'Authorization': 'Bearer $token'},
+    ).timeout(const Duration(seconds: 10));
+    if (response.statusCode == 200) {
+      return jsonDecode(response.body);
+    }
+    throw Exception('Failed to load home');
+  }
+
   static Future<List<dynamic>> getCategories() async {
     final response =
         await http.get(Uri.parse('$productServiceUrl/categories'));